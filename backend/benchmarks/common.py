@@ -0,0 +1,67 @@
+import json
+import os
+import platform
+import random
+import string
+import subprocess
+import time
+from typing import Dict, List
+
+import numpy as np
+
+
+def percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    if not samples_ms:
+        return {"count": 0}
+    values = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "count": int(values.size),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def write_results(path: str, suite: str, results: dict):
+    """Write one suite's results as JSON, tagged with the commit they came from."""
+    payload = {
+        "suite": suite,
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "results": results,
+    }
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2)
+    print(json.dumps(payload, indent=2))
+
+
+def synthetic_pdf(path: str, pages: int = 40, sentences_per_page: int = 25, seed: int = 0) -> str:
+    """Write a PDF of random sentences drawn from a fixed vocabulary."""
+    import fitz
+
+    rng = random.Random(seed)
+    vocabulary = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9))) for _ in range(3000)]
+    document = fitz.open()
+    for _ in range(pages):
+        text = " ".join(
+            " ".join(rng.choices(vocabulary, k=rng.randint(8, 16))).capitalize() + "."
+            for _ in range(sentences_per_page)
+        )
+        document.new_page().insert_textbox(fitz.Rect(40, 40, 560, 800), text, fontsize=8)
+    document.save(path)
+    return path
@@ -0,0 +1,82 @@
+"""Compare two benchmark result files and flag regressions.
+
+    python -m benchmarks.compare baseline/load.json results/load.json --threshold 0.1
+
+Every latency percentile (``p50_ms``, ``p95_ms``, ``p99_ms``) and rate
+(``throughput_rps``, ``*_per_sec``) found in both files is compared by its
+path. Exits with status 1 if any got worse by more than ``--threshold``.
+"""
+import argparse
+import json
+import sys
+from typing import Dict, Iterator, Tuple
+
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms", "error_rate")
+
+
+def higher_is_better(key: str) -> bool:
+    return key == "throughput_rps" or key.endswith("_per_sec")
+
+
+def metrics(node, path: str = "") -> Iterator[Tuple[str, str, float]]:
+    if isinstance(node, dict):
+        for key, value in node.items():
+            child = f"{path}.{key}" if path else key
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                if key in LOWER_IS_BETTER or higher_is_better(key):
+                    yield child, key, float(value)
+            else:
+                yield from metrics(value, child)
+    elif isinstance(node, list):
+        for i, value in enumerate(node):
+            yield from metrics(value, f"{path}[{i}]")
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> Dict[str, list]:
+    before = {path: value for path, _, value in metrics(baseline["results"])}
+    report = {"regressions": [], "improvements": [], "unchanged": []}
+    for path, key, value in metrics(current["results"]):
+        if path not in before:
+            continue
+        old = before[path]
+        if old == 0:
+            change = 0.0 if value == 0 else float("inf")
+        else:
+            change = (value - old) / old
+        worse = -change if higher_is_better(key) else change
+        entry = {"metric": path, "baseline": old, "current": value, "change": round(change, 4)}
+        if worse > threshold:
+            report["regressions"].append(entry)
+        elif worse < -threshold:
+            report["improvements"].append(entry)
+        else:
+            report["unchanged"].append(entry)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative change that counts, e.g. 0.1 for 10%%")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    if baseline.get("suite") != current.get("suite"):
+        parser.error(f"suites differ: {baseline.get('suite')} vs {current.get('suite')}")
+
+    report = compare(baseline, current, args.threshold)
+    print(f"{baseline.get('commit')} -> {current.get('commit')} ({current['suite']})")
+    for label in ("regressions", "improvements"):
+        for entry in report[label]:
+            print(f"  {label[:-1]}: {entry['metric']} {entry['baseline']} -> {entry['current']} "
+                  f"({entry['change']:+.1%})")
+    print(f"  {len(report['unchanged'])} metrics within {args.threshold:.0%}")
+    sys.exit(1 if report["regressions"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,482 @@
+"""Local stand-ins for the Gemini and Google Calendar APIs.
+
+    python -m benchmarks.fakes --llm-latency-ms 800 --failure-rate 0.01
+
+starts both servers and prints the environment variables that point the
+backend at them. Each server adds a configurable latency and fails a
+configurable share of requests, so the backend can be measured without
+network access, quota or cost.
+
+The Gemini server answers ``generateContent``, ``streamGenerateContent``
+(SSE for ``gemini_client``, a JSON array for the LangChain REST client),
+``embedContent`` and ``batchEmbedContents``. Embeddings are hashed bags of
+words, so similar texts get similar vectors. The Calendar server keeps
+events in memory and supports incremental sync, inserts, deletes,
+free/busy queries and batch requests.
+"""
+import argparse
+import email
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+from dateutil import parser as date_parser
+
+EMBEDDING_DIM = 768
+
+
+@dataclass
+class FaultProfile:
+    """Latency and failures added to every request a fake server handles."""
+
+    latency_ms: float = 0.0
+    # Uniform extra delay in [0, jitter_ms).
+    jitter_ms: float = 0.0
+    failure_rate: float = 0.0
+    failure_status: int = 503
+
+    def delay(self, rng: random.Random):
+        seconds = (self.latency_ms + rng.random() * self.jitter_ms) / 1000
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def fails(self, rng: random.Random) -> bool:
+        return self.failure_rate > 0 and rng.random() < self.failure_rate
+
+
+class FakeServer:
+    """A threaded HTTP server on a free local port; use as a context manager."""
+
+    handler_class = BaseHTTPRequestHandler
+
+    def __init__(self, seed: int = 0, port: int = 0):
+        self.rng = random.Random(seed)
+        self.requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        handler = type("Handler", (self.handler_class,), {"server_state": self})
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def count(self, kind: str):
+        with self._lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+
+    def start(self) -> "FakeServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class JsonHandler(BaseHTTPRequestHandler):
+    server_state: FakeServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def send_json(self, status: int, payload=None, headers: Optional[dict] = None):
+        body = b"" if payload is None else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_failure(self, status: int):
+        error = {"code": status, "message": "Injected failure", "status": "UNAVAILABLE"}
+        if status == 429:
+            error.update(status="RESOURCE_EXHAUSTED", details=[
+                {"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "1s"}
+            ])
+        self.send_json(status, {"error": error})
+
+
+def hashed_embedding(text: str, dim: int = EMBEDDING_DIM) -> List[float]:
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in re.findall(r"\w+", text.lower()):
+        vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % dim] += 1.0
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+def prompt_text(body: dict) -> str:
+    return "\n".join(
+        part.get("text", "")
+        for content in body.get("contents", [])
+        for part in content.get("parts", [])
+    )
+
+
+class GeminiHandler(JsonHandler):
+    server_state: "FakeGeminiServer"
+
+    def do_POST(self):
+        state = self.server_state
+        path = urlparse(self.path)
+        method = path.path.rsplit(":", 1)[-1]
+        body = json.loads(self.read_body() or b"{}")
+        kind = "embedding" if method in ("embedContent", "batchEmbedContents") else "llm"
+        state.count(method)
+
+        profile = state.embedding if kind == "embedding" else state.llm
+        profile.delay(state.rng)
+        if profile.fails(state.rng):
+            state.count(f"{method}:failed")
+            return self.send_failure(profile.failure_status)
+
+        if method == "embedContent":
+            return self.send_json(200, {"embedding": {"values": hashed_embedding(prompt_text({"contents": [body["content"]]}))}})
+        if method == "batchEmbedContents":
+            return self.send_json(200, {"embeddings": [
+                {"values": hashed_embedding(prompt_text({"contents": [r["content"]]}))} for r in body["requests"]
+            ]})
+        if method == "generateContent":
+            return self.send_json(200, state.response(prompt_text(body)))
+        if method == "streamGenerateContent":
+            return self.stream(prompt_text(body), "sse" in parse_qs(path.query).get("alt", []))
+        self.send_json(404, {"error": {"code": 404, "message": f"Unknown method {method}"}})
+
+    def stream(self, prompt: str, sse: bool):
+        state = self.server_state
+        text = state.reply(prompt)
+        words = text.split(" ")
+        size = max(1, len(words) // state.stream_chunks)
+        chunks = [" ".join(words[i:i + size]) + " " for i in range(0, len(words), size)]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream" if sse else "application/json")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for index, chunk in enumerate(chunks):
+            if index:
+                time.sleep(state.chunk_delay_ms / 1000)
+            event = {"candidates": [{"content": {"parts": [{"text": chunk}], "role": "model"}, "index": 0}]}
+            if index == len(chunks) - 1:
+                event["candidates"][0]["finishReason"] = "STOP"
+                event["usageMetadata"] = state.usage(prompt, text)
+            if sse:
+                self.wfile.write(f"data: {json.dumps(event)}\r\n\r\n".encode())
+            else:
+                self.wfile.write((("[" if index == 0 else ",") + json.dumps(event)).encode())
+            self.wfile.flush()
+        if not sse:
+            self.wfile.write(b"]")
+        self.close_connection = True
+
+
+class FakeGeminiServer(FakeServer):
+    """Generative Language API stand-in.
+
+    Replies depend on the prompt: flash-card prompts get a JSON stack,
+    ReAct agent prompts call ``get_calendar_events`` once and then give a
+    final answer, and anything else gets ``reply_words`` words of filler.
+    """
+
+    handler_class = GeminiHandler
+
+    def __init__(
+        self,
+        llm: Optional[FaultProfile] = None,
+        embedding: Optional[FaultProfile] = None,
+        reply_words: int = 120,
+        stream_chunks: int = 8,
+        chunk_delay_ms: float = 20.0,
+        seed: int = 0,
+        port: int = 0,
+    ):
+        super().__init__(seed, port)
+        self.llm = llm or FaultProfile()
+        self.embedding = embedding or FaultProfile()
+        self.reply_words = reply_words
+        self.stream_chunks = max(1, stream_chunks)
+        self.chunk_delay_ms = chunk_delay_ms
+
+    def reply(self, prompt: str) -> str:
+        if "flashcards" in prompt and '"qasets"' in prompt:
+            return json.dumps({
+                "name": "Benchmark Stack",
+                "description": "Cards generated by the benchmark stand-in.",
+                "qasets": [
+                    {"question": f"Question {i} about the document?", "answer": f"Answer {i}."}
+                    for i in range(1, 11)
+                ],
+            })
+        if "Action Input:" in prompt:
+            # The format instructions mention "Action:" too; only the scratchpad names the tool.
+            if "Action: get_calendar_events" not in prompt:
+                today = datetime.now(timezone.utc).date()
+                return (
+                    "Thought: I need to look at the calendar.\n"
+                    "Action: get_calendar_events\n"
+                    "Action Input: " + json.dumps({
+                        "start_time": f"{today}T00:00:00",
+                        "end_time": f"{today + timedelta(days=7)}T00:00:00",
+                        "timezone": "UTC",
+                    })
+                )
+            return "Thought: I now know the final answer\nFinal Answer: Your week has room for focus time."
+        words = re.findall(r"\w+", prompt)[-self.reply_words:] or ["ok"]
+        return " ".join((words * (self.reply_words // len(words) + 1))[:self.reply_words])
+
+    def usage(self, prompt: str, text: str) -> dict:
+        prompt_tokens, reply_tokens = len(prompt) // 4 + 1, len(text) // 4 + 1
+        return {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": reply_tokens,
+            "totalTokenCount": prompt_tokens + reply_tokens,
+        }
+
+    def response(self, prompt: str) -> dict:
+        text = self.reply(prompt)
+        return {
+            "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+            "usageMetadata": self.usage(prompt, text),
+        }
+
+
+class CalendarHandler(JsonHandler):
+    server_state: "FakeCalendarServer"
+
+    def handle_request(self, method: str) -> bool:
+        state = self.server_state
+        state.count(method)
+        state.profile.delay(state.rng)
+        if state.profile.fails(state.rng):
+            state.count(f"{method}:failed")
+            self.send_failure(state.profile.failure_status)
+            return False
+        return True
+
+    def do_GET(self):
+        if not self.handle_request("GET"):
+            return
+        path = urlparse(self.path)
+        if path.path.endswith("/events"):
+            return self.send_json(*self.server_state.list_events(parse_qs(path.query)))
+        self.send_json(404, {"error": {"code": 404, "message": "Not Found"}})
+
+    def do_POST(self):
+        body = self.read_body()
+        if not self.handle_request("POST"):
+            return
+        path = urlparse(self.path).path
+        if path.startswith("/batch"):
+            return self.batch(body)
+        if path.endswith("/freeBusy"):
+            return self.send_json(200, self.server_state.free_busy(json.loads(body)))
+        self.send_json(*self.server_state.route("POST", path, body))
+
+    def do_DELETE(self):
+        if not self.handle_request("DELETE"):
+            return
+        self.send_json(*self.server_state.route("DELETE", urlparse(self.path).path, b""))
+
+    def batch(self, body: bytes):
+        message = email.message_from_bytes(
+            b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + body
+        )
+        parts = []
+        for part in message.get_payload():
+            raw = part.get_payload()
+            head, _, part_body = raw.partition("\r\n\r\n") if "\r\n\r\n" in raw else raw.partition("\n\n")
+            method, target, _ = head.splitlines()[0].split(" ", 2)
+            status, payload = self.server_state.route(method, urlparse(target).path, part_body.encode())
+            text = "" if payload is None else json.dumps(payload)
+            parts.append(
+                f"--batch_boundary\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{part['Content-ID'].strip('<>')}>\r\n\r\n"
+                f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(text)}\r\n\r\n{text}\r\n"
+            )
+        data = ("".join(parts) + "--batch_boundary--").encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "multipart/mixed; boundary=batch_boundary")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeCalendarServer(FakeServer):
+    """Google Calendar v3 stand-in holding one calendar's events in memory."""
+
+    handler_class = CalendarHandler
+
+    def __init__(self, profile: Optional[FaultProfile] = None, seed: int = 0, port: int = 0):
+        super().__init__(seed, port)
+        self.profile = profile or FaultProfile()
+        self.events: Dict[str, dict] = {}
+        self.version = 0
+        self.changes: List[Tuple[int, str]] = []
+        self._events_lock = threading.Lock()
+
+    def add_event(self, event: dict) -> dict:
+        with self._events_lock:
+            event = {**event, "id": event.get("id") or uuid.uuid4().hex, "status": "confirmed"}
+            event.setdefault("htmlLink", f"{self.url}/event/{event['id']}")
+            self.events[event["id"]] = event
+            self.version += 1
+            self.changes.append((self.version, event["id"]))
+            return event
+
+    def seed_events(self, count: int, days: int = 30, start: Optional[datetime] = None):
+        """Add ``count`` one-hour events spread over ``days`` working days."""
+        start = (start or datetime.now(timezone.utc)).replace(minute=0, second=0, microsecond=0)
+        for i in range(count):
+            begin = start + timedelta(days=i % days, hours=9 + (i * 7) % 8)
+            self.add_event({
+                "summary": f"Seeded meeting {i}",
+                "start": {"dateTime": begin.isoformat()},
+                "end": {"dateTime": (begin + timedelta(hours=1)).isoformat()},
+            })
+
+    def list_events(self, query: dict) -> Tuple[int, dict]:
+        token = query.get("syncToken", [None])[0]
+        with self._events_lock:
+            if token:
+                since = int(token)
+                changed = {event_id for version, event_id in self.changes if version > since}
+                items = [self.events.get(i, {"id": i, "status": "cancelled"}) for i in changed]
+            else:
+                items = list(self.events.values())
+            return 200, {"items": items, "nextSyncToken": str(self.version)}
+
+    def free_busy(self, body: dict) -> dict:
+        low, high = date_parser.isoparse(body["timeMin"]), date_parser.isoparse(body["timeMax"])
+        busy = []
+        with self._events_lock:
+            for event in self.events.values():
+                if "dateTime" not in event["start"]:
+                    continue
+                start = date_parser.isoparse(event["start"]["dateTime"])
+                end = date_parser.isoparse(event["end"]["dateTime"])
+                if start < high and end > low:
+                    busy.append({"start": max(start, low).isoformat(), "end": min(end, high).isoformat()})
+        busy.sort(key=lambda interval: interval["start"])
+        return {"calendars": {item["id"]: {"busy": busy} for item in body.get("items", [])}}
+
+    def route(self, method: str, path: str, body: bytes) -> Tuple[int, Optional[dict]]:
+        if method == "POST" and path.endswith("/events"):
+            return 200, self.add_event(json.loads(body))
+        if method == "DELETE" and "/events/" in path:
+            event_id = path.rsplit("/", 1)[1]
+            with self._events_lock:
+                if event_id not in self.events:
+                    return 404, {"error": {"code": 404, "message": "Not Found"}}
+                del self.events[event_id]
+                self.version += 1
+                self.changes.append((self.version, event_id))
+            return 204, None
+        return 404, {"error": {"code": 404, "message": "Not Found"}}
+
+
+def backend_env(gemini: FakeGeminiServer, calendar: Optional[FakeCalendarServer] = None) -> Dict[str, str]:
+    """Environment variables that point the backend at the fake servers."""
+    env = {
+        "GOOGLE_API_KEY": "benchmark",
+        "GEMINI_API_BASE": f"{gemini.url}/v1beta",
+        "GOOGLE_GENAI_API_ENDPOINT": gemini.url,
+        "EMBEDDING_BACKEND": "gemini",
+    }
+    if calendar is not None:
+        env["GOOGLE_CALENDAR_API_ENDPOINT"] = calendar.url
+    return env
+
+
+def use_fake_embeddings(latency_ms: float = 80.0) -> FakeGeminiServer:
+    """Start a Gemini stand-in and point this process at it.
+
+    Must run before ``llm_config`` is imported, since it reads the
+    environment at import time.
+    """
+    gemini = FakeGeminiServer(embedding=FaultProfile(latency_ms=latency_ms)).start()
+    os.environ.update(backend_env(gemini))
+    return gemini
+
+
+def profile_args(parser: argparse.ArgumentParser, prefix: str, latency_ms: float):
+    parser.add_argument(f"--{prefix}-latency-ms", type=float, default=latency_ms)
+    parser.add_argument(f"--{prefix}-jitter-ms", type=float, default=latency_ms / 2)
+
+
+def profiles_from_args(args: argparse.Namespace) -> Dict[str, FaultProfile]:
+    return {
+        name: FaultProfile(
+            latency_ms=getattr(args, f"{name}_latency_ms"),
+            jitter_ms=getattr(args, f"{name}_jitter_ms"),
+            failure_rate=args.failure_rate,
+            failure_status=args.failure_status,
+        )
+        for name in ("llm", "embedding", "calendar")
+    }
+
+
+def add_fake_arguments(parser: argparse.ArgumentParser):
+    profile_args(parser, "llm", 600)
+    profile_args(parser, "embedding", 80)
+    profile_args(parser, "calendar", 60)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of requests each fake fails")
+    parser.add_argument("--failure-status", type=int, default=503)
+    parser.add_argument("--reply-words", type=int, default=120)
+    parser.add_argument("--calendar-events", type=int, default=200, help="Events to seed the calendar with")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def start_fakes(args: argparse.Namespace, gemini_port: int = 0, calendar_port: int = 0):
+    profiles = profiles_from_args(args)
+    gemini = FakeGeminiServer(
+        profiles["llm"], profiles["embedding"], reply_words=args.reply_words, seed=args.seed, port=gemini_port
+    ).start()
+    calendar = FakeCalendarServer(profiles["calendar"], seed=args.seed, port=calendar_port).start()
+    calendar.seed_events(args.calendar_events)
+    return gemini, calendar
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_fake_arguments(parser)
+    parser.add_argument("--gemini-port", type=int, default=8701)
+    parser.add_argument("--calendar-port", type=int, default=8702)
+    args = parser.parse_args()
+
+    gemini, calendar = start_fakes(args, args.gemini_port, args.calendar_port)
+    for name, value in backend_env(gemini, calendar).items():
+        print(f"export {name}={value}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        gemini.stop()
+        calendar.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Load-test the flash-card library endpoints at large library sizes.
+
+    python -m benchmarks.flash_cards --stacks 1000 --stacks 50000 --out results/flash_cards.json
+
+For each size a fresh SQLite database is seeded with ``--stacks`` stacks of
+``--cards`` cards and the backend is started on it (see
+``benchmarks.load``). Card text is drawn from a Zipf-distributed
+vocabulary so searches can be measured for both common and rare words.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import sqlite3
+import string
+import sys
+import tempfile
+import time
+from typing import List
+
+import httpx
+from sqlalchemy import create_engine
+
+from benchmarks.common import write_results
+from benchmarks.fakes import FakeCalendarServer, FakeGeminiServer, backend_env
+from benchmarks.load import AppServer, Scenario, run_scenario
+from db import Base
+from search import create_search_index
+import models  # noqa: F401  registers the tables on Base
+
+VOCABULARY_SIZE = 20000
+
+
+def vocabulary(seed: int) -> List[str]:
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < VOCABULARY_SIZE:
+        words.add("".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10))))
+    return sorted(words, key=lambda word: rng.random())
+
+
+def seed_library(path: str, stacks: int, cards: int, seed: int) -> dict:
+    """Create the schema and fill it; returns the words used for search queries."""
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+
+    words = vocabulary(seed)
+    rng = random.Random(seed)
+    # Zipf-like: word i is drawn with weight 1 / (i + 1).
+    cum_weights = list(itertools.accumulate(1 / (i + 1) for i in range(len(words))))
+
+    def text(count: int) -> str:
+        return " ".join(rng.choices(words, cum_weights=cum_weights, k=count))
+
+    started = time.perf_counter()
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO stacks (id, name, description) VALUES (?, ?, ?)",
+        ((s, text(3).title(), text(15)) for s in range(1, stacks + 1)),
+    )
+    conn.executemany(
+        "INSERT INTO qasets (id, question, answer, stack_id) VALUES (?, ?, ?, ?)",
+        (
+            ((s - 1) * cards + c + 1, text(10) + "?", text(20), s)
+            for s in range(1, stacks + 1)
+            for c in range(cards)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+    engine = create_engine(f"sqlite:///{path}")
+    create_search_index(engine)
+    engine.dispose()
+    return {
+        "seed_s": round(time.perf_counter() - started, 2),
+        "common_word": words[0],
+        "rare_word": words[len(words) // 2],
+    }
+
+
+def scenarios(stacks: int, cards: int, seeded: dict, seed: int) -> List[Scenario]:
+    rng = random.Random(seed)
+
+    def stack_id() -> int:
+        return rng.randint(1, stacks)
+
+    def edit(client: httpx.AsyncClient, i: int) -> httpx.Request:
+        s = stack_id()
+        first = (s - 1) * cards + 1
+        return client.build_request("PATCH", "/edit-flash-cards", json={
+            "id": s,
+            "name": f"Edited stack {i}",
+            "description": "Edited by the benchmark",
+            "qasets": [
+                {"id": first + c, "question": f"Edited question {i}.{c}?", "answer": "Edited answer"}
+                for c in range(cards)
+            ],
+        })
+
+    return [
+        Scenario("list_first_page", lambda c, i: c.build_request("GET", "/flash-cards", params={"limit": 50})),
+        Scenario("list_deep_page", lambda c, i: c.build_request(
+            "GET", "/flash-cards", params={"limit": 50, "after_id": stack_id()})),
+        Scenario("get_flash_cards_page", lambda c, i: c.build_request(
+            "GET", "/get-flash-cards", params={"limit": 50, "after_id": stack_id()})),
+        Scenario("get_stack", lambda c, i: c.build_request("GET", f"/get-flash-cards/{stack_id()}")),
+        Scenario("search_common_word", lambda c, i: c.build_request(
+            "GET", "/search-flash-cards", params={"q": seeded["common_word"]})),
+        Scenario("search_rare_word", lambda c, i: c.build_request(
+            "GET", "/search-flash-cards", params={"q": seeded["rare_word"]})),
+        Scenario("search_prefix", lambda c, i: c.build_request(
+            "GET", "/search-flash-cards", params={"q": seeded["rare_word"][:3]})),
+        Scenario("edit_stack", edit),
+        # Deletes walk down from the newest stack so every request hits a real one.
+        Scenario("delete_stack", lambda c, i: c.build_request("DELETE", f"/delete-flash-cards/{stacks - i}")),
+    ]
+
+
+async def run_size(url: str, stacks: int, cards: int, seeded: dict, requests: int, concurrency: int, seed: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency * 2)
+    async with httpx.AsyncClient(base_url=url, timeout=httpx.Timeout(120, connect=10), limits=limits) as client:
+        results = {}
+        for scenario in scenarios(stacks, cards, seeded, seed):
+            results[scenario.name] = await run_scenario(client, scenario, min(requests, stacks), concurrency)
+            print(f"{stacks} stacks, {scenario.name}: {results[scenario.name]['throughput_rps']} req/s, "
+                  f"p95 {results[scenario.name]['latency'].get('p95_ms')} ms", file=sys.stderr)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stacks", type=int, action="append", default=[], help="Library size; repeatable")
+    parser.add_argument("--cards", type=int, default=10, help="Cards per stack")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="benchmark_results/flash_cards.json")
+    args = parser.parse_args()
+
+    sizes = {}
+    with FakeGeminiServer() as gemini, FakeCalendarServer() as calendar:
+        for stacks in args.stacks or [1000, 10000, 50000]:
+            with tempfile.TemporaryDirectory() as workdir:
+                seeded = seed_library(os.path.join(workdir, "bench.db"), stacks, args.cards, args.seed)
+                with AppServer(workdir, backend_env(gemini, calendar)) as server:
+                    sizes[str(stacks)] = {
+                        "cards": stacks * args.cards,
+                        "seed_s": seeded["seed_s"],
+                        "scenarios": asyncio.run(run_size(
+                            server.url, stacks, args.cards, seeded, args.requests, args.concurrency, args.seed
+                        )),
+                    }
+
+    write_results(args.out, "flash_cards", {
+        "cards_per_stack": args.cards,
+        "concurrency": args.concurrency,
+        "sizes": sizes,
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Measure PDF ingestion throughput with the configured embedding backend.
+
+    EMBEDDING_BACKEND=local python -m benchmarks.ingest --pdf book.pdf --out results/ingest.json
+    python -m benchmarks.ingest --pdf book.pdf --fake-embeddings 80
+
+Parsing and splitting, embedding, and the vector store write are timed
+separately, and each is reported in chunks/sec. The embedding cache is
+bypassed so every chunk is really embedded.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.common import write_results
+from benchmarks.fakes import use_fake_embeddings
+from ingest import load_and_split
+from vector_store import PersistentVectorStore
+
+
+def run(pdf: str, embeddings, repeat: int = 1) -> dict:
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        texts, metadatas = load_and_split(pdf, os.path.basename(pdf))
+        split_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        vectors = embeddings.embed_documents(texts)
+        embed_s = time.perf_counter() - started
+
+        with tempfile.TemporaryDirectory() as directory:
+            store = PersistentVectorStore(embeddings, directory)
+            started = time.perf_counter()
+            store.add_vectors(vectors, texts, metadatas=metadatas)
+            store_s = time.perf_counter() - started
+
+        total_s = split_s + embed_s + store_s
+        runs.append({
+            "pages": len({m.get("page") for m in metadatas}),
+            "chunks": len(texts),
+            "split_s": round(split_s, 3),
+            "embed_s": round(embed_s, 3),
+            "store_s": round(store_s, 3),
+            "total_s": round(total_s, 3),
+            "embed_chunks_per_sec": round(len(texts) / embed_s, 1) if embed_s else None,
+            "chunks_per_sec": round(len(texts) / total_s, 1) if total_s else None,
+        })
+    return {"pdf": os.path.basename(pdf), "runs": runs}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pdf", required=True)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--out", default="benchmark_results/ingest.json")
+    parser.add_argument(
+        "--fake-embeddings", type=float, metavar="LATENCY_MS",
+        help="Embed with the local Gemini stand-in (see benchmarks.fakes) at this latency",
+    )
+    args = parser.parse_args()
+
+    if args.fake_embeddings is not None:
+        use_fake_embeddings(args.fake_embeddings)
+
+    from llm_config import EMBEDDING_BACKEND, EMBEDDING_MODEL, embedding_backend
+
+    results = run(args.pdf, embedding_backend, args.repeat)
+    results.update({"backend": EMBEDDING_BACKEND, "model": EMBEDDING_MODEL})
+    write_results(args.out, "ingest", results)
+
+
+if __name__ == "__main__":
+    main()
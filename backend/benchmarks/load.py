@@ -0,0 +1,289 @@
+"""Load-test every FastAPI endpoint against local Gemini and Calendar stand-ins.
+
+    python -m benchmarks.load --requests 200 --concurrency 16 --out results/load.json
+    python -m benchmarks.load --scenario upload_ask --llm-latency-ms 1500 --failure-rate 0.02
+
+The backend runs in a uvicorn subprocess whose databases, caches and
+vector stores live in a temporary directory, with every Google API call
+going to the fakes in ``benchmarks.fakes``. Each scenario sends
+``--requests`` requests from ``--concurrency`` concurrent clients and
+reports throughput, error rate and p50/p95/p99 latency; streaming
+scenarios also report time to first byte.
+
+Streaming ``/upload/ask`` is not covered: LangChain's async Gemini client
+only speaks gRPC, so it cannot be pointed at the stand-in.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.common import percentiles, synthetic_pdf, write_results
+from benchmarks.fakes import add_fake_arguments, backend_env, start_fakes
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JOB_DONE = ("succeeded", "failed")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class AppServer:
+    """The backend in a uvicorn subprocess, with all state under ``workdir``."""
+
+    def __init__(self, workdir: str, env: Dict[str, str], startup_timeout: float = 120):
+        self.workdir = workdir
+        self.port = free_port()
+        self.startup_timeout = startup_timeout
+        self.env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+            "VECTOR_STORE_DIR": os.path.join(workdir, "vector_store"),
+            "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embedding_cache.sqlite3"),
+            "CHAT_CACHE_PATH": os.path.join(workdir, "chat_cache.sqlite3"),
+            "JOB_UPLOAD_DIR": os.path.join(workdir, "job_uploads"),
+            "GOOGLE_TOKEN_PATH": os.path.join(workdir, "token.json"),
+            "LANGCHAIN_TRACING_V2": "false",
+            **env,
+        }
+        self._process: Optional[subprocess.Popen] = None
+        self._log = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self) -> "AppServer":
+        self._log = open(os.path.join(self.workdir, "server.log"), "wb")
+        self._process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+             "--port", str(self.port), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=self.env, stdout=self._log, stderr=subprocess.STDOUT,
+        )
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self._process.poll() is not None:
+                break
+            try:
+                if httpx.get(f"{self.url}/cache/stats", timeout=2).status_code == 200:
+                    return self
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.25)
+        self.__exit__()
+        raise RuntimeError(f"Backend did not start; see {self._log.name}")
+
+    def __exit__(self, *exc):
+        if self._process and self._process.poll() is None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+        if self._log:
+            self._log.close()
+
+
+@dataclass
+class Scenario:
+    """``build`` makes the i-th request; ``finish`` may await follow-up work, e.g. a job."""
+
+    name: str
+    build: Callable[[httpx.AsyncClient, int], httpx.Request]
+    stream: bool = False
+    finish: Optional[Callable[[httpx.AsyncClient, bytes], Awaitable[bool]]] = None
+    requests: Optional[int] = None
+    concurrency: Optional[int] = None
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, requests: int, concurrency: int) -> dict:
+    requests = scenario.requests or requests
+    concurrency = min(scenario.concurrency or concurrency, requests)
+    latencies, first_bytes = [], []
+    statuses, errors = Counter(), Counter()
+    counter = itertools.count()
+
+    async def one(i: int):
+        request = scenario.build(client, i)
+        started, first_byte, body = time.perf_counter(), None, []
+        try:
+            response = await client.send(request, stream=True)
+            try:
+                async for chunk in response.aiter_bytes():
+                    first_byte = first_byte or time.perf_counter()
+                    body.append(chunk)
+            finally:
+                await response.aclose()
+            status = response.status_code
+            if response.is_success and scenario.finish is not None and not await scenario.finish(client, b"".join(body)):
+                status = "failed"
+        except httpx.HTTPError as e:
+            errors[type(e).__name__] += 1
+            return
+        statuses[status] += 1
+        latencies.append((time.perf_counter() - started) * 1000)
+        if scenario.stream and first_byte is not None:
+            first_bytes.append((first_byte - started) * 1000)
+
+    async def worker():
+        while (i := next(counter)) < requests:
+            await one(i)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    succeeded = sum(count for status, count in statuses.items() if isinstance(status, int) and status < 400)
+    result = {
+        "requests": requests,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 2) if elapsed else None,
+        "error_rate": round(1 - succeeded / requests, 4),
+        "statuses": {str(status): count for status, count in statuses.items()},
+        "latency": percentiles(latencies),
+    }
+    if errors:
+        result["errors"] = dict(errors)
+    if scenario.stream:
+        result["ttfb"] = percentiles(first_bytes)
+    return result
+
+
+async def no_error(client: httpx.AsyncClient, body: bytes) -> bool:
+    # /chat and /calendar report failures as a 200 with an "error" field.
+    return "error" not in json.loads(body)
+
+
+async def uploaded(client: httpx.AsyncClient, body: bytes) -> bool:
+    return all("error" not in document for document in json.loads(body)["documents"])
+
+
+async def wait_for_job(client: httpx.AsyncClient, body: bytes, poll: float = 0.1) -> bool:
+    job_id = json.loads(body)["id"]
+    while True:
+        job = (await client.get(f"/flash-card-jobs/{job_id}")).json()
+        if job["status"] in JOB_DONE:
+            return job["status"] == "succeeded"
+        await asyncio.sleep(poll)
+
+
+def scenarios(pdf: bytes, unique_pdfs: List[bytes], document_id: str, session_id: str) -> List[Scenario]:
+    """Uploads and flash-card jobs send a different PDF each time so the embedding cache misses."""
+    def pdf_file(i: int, unique: bool = False) -> tuple:
+        return f"bench-{i}.pdf", unique_pdfs[i % len(unique_pdfs)] if unique else pdf, "application/pdf"
+
+    def chat(stream: bool, cache: bool):
+        def build(client: httpx.AsyncClient, i: int) -> httpx.Request:
+            data = {"action": "summarize-paragraph", "stream": str(stream).lower(), "no_cache": str(not cache).lower()}
+            return client.build_request("POST", "/chat", data=data, files={"file": pdf_file(i)})
+        return build
+
+    def ask(repeat: bool):
+        def build(client: httpx.AsyncClient, i: int) -> httpx.Request:
+            question = "What is this document about?" if repeat else f"What does section {i} say about topic {i * 7919 % 1000}?"
+            return client.build_request("POST", "/upload/ask", json={"question": question, "document_ids": [document_id]})
+        return build
+
+    return [
+        Scenario("cache_stats", lambda c, i: c.build_request("GET", "/cache/stats")),
+        Scenario("chat", chat(stream=False, cache=False), finish=no_error),
+        Scenario("chat_cached", chat(stream=False, cache=True), finish=no_error),
+        Scenario("chat_stream", chat(stream=True, cache=False), stream=True),
+        Scenario("calendar_fast_path", lambda c, i: c.build_request(
+            "POST", "/calendar", json={"question": "What's on my calendar today?"}), finish=no_error),
+        Scenario("calendar_agent", lambda c, i: c.build_request(
+            "POST", "/calendar", json={"question": f"How busy am I over the next few days? ({i})"}), finish=no_error),
+        Scenario("upload", lambda c, i: c.build_request(
+            "POST", "/upload", data={"session_id": f"bench-upload-{i}"},
+            files={"files": pdf_file(3 * i, unique=True)}), finish=uploaded),
+        Scenario("upload_stream", lambda c, i: c.build_request(
+            "POST", "/upload", data={"session_id": f"bench-upload-stream-{i}", "stream": "true"},
+            files={"files": pdf_file(3 * i + 1, unique=True)}), stream=True),
+        Scenario("upload_documents", lambda c, i: c.build_request(
+            "GET", "/upload/documents", params={"session_id": session_id})),
+        Scenario("upload_ask", ask(repeat=False)),
+        Scenario("upload_ask_repeated", ask(repeat=True)),
+        Scenario("create_flash_cards", lambda c, i: c.build_request(
+            "POST", "/create-flash-cards", files={"file": pdf_file(3 * i + 2, unique=True)}), finish=wait_for_job),
+    ]
+
+
+async def run(
+    url: str, pdf: bytes, unique_pdfs: List[bytes], requests: int, concurrency: int, only: List[str]
+) -> dict:
+    timeout = httpx.Timeout(300, connect=10)
+    limits = httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency * 2)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        session_id = "bench-ask"
+        setup = await client.post(
+            "/upload", data={"session_id": session_id},
+            files={"files": ("bench.pdf", pdf, "application/pdf")},
+        )
+        setup.raise_for_status()
+        document_id = setup.json()["document_ids"][0]
+
+        results = {}
+        for scenario in scenarios(pdf, unique_pdfs, document_id, session_id):
+            if only and scenario.name not in only:
+                continue
+            results[scenario.name] = await run_scenario(client, scenario, requests, concurrency)
+            print(f"{scenario.name}: {results[scenario.name]['throughput_rps']} req/s, "
+                  f"p95 {results[scenario.name]['latency'].get('p95_ms')} ms", file=sys.stderr)
+        return results
+
+
+def read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_fake_arguments(parser)
+    parser.add_argument("--requests", type=int, default=100, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--pdf", help="PDF to upload; a synthetic one by default")
+    parser.add_argument("--pdf-pages", type=int, default=10)
+    parser.add_argument("--scenario", action="append", default=[], help="Run only this scenario; repeatable")
+    parser.add_argument("--out", default="benchmark_results/load.json")
+    args = parser.parse_args()
+
+    gemini, calendar = start_fakes(args)
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            pdf = read_file(args.pdf or synthetic_pdf(os.path.join(workdir, "bench.pdf"), args.pdf_pages, seed=args.seed))
+            unique_pdfs = [
+                read_file(synthetic_pdf(os.path.join(workdir, f"unique-{i}.pdf"), args.pdf_pages, seed=args.seed + i + 1))
+                for i in range(3 * args.requests)
+            ]
+            with AppServer(workdir, backend_env(gemini, calendar)) as server:
+                results = asyncio.run(run(server.url, pdf, unique_pdfs, args.requests, args.concurrency, args.scenario))
+    finally:
+        gemini.stop()
+        calendar.stop()
+
+    write_results(args.out, "load", {
+        "config": {
+            key: value for key, value in vars(args).items() if key not in ("out", "scenario")
+        },
+        "fake_requests": {"gemini": gemini.requests, "calendar": calendar.requests},
+        "scenarios": results,
+    })
+
+
+if __name__ == "__main__":
+    main()
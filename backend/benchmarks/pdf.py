@@ -0,0 +1,82 @@
+"""Time PDF text extraction and chunk splitting.
+
+    python -m benchmarks.pdf --pages 10 --pages 200 --repeat 5 --out results/pdf.json
+    python -m benchmarks.pdf --pdf notes.pdf
+
+Each PDF (given, or generated with the requested page counts) is read
+``repeat`` times by every extractor: ``extract_text_from_pdf`` (PyMuPDF,
+parallel above PDF_PARALLEL_MIN_PAGES pages), the same without the process
+pool, and LangChain's ``PyPDFLoader`` as used for uploads. Splitting is
+timed on the ``PyPDFLoader`` pages with the upload splitter settings.
+"""
+import argparse
+import os
+import tempfile
+import time
+from typing import Callable, List
+
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from benchmarks.common import percentiles, synthetic_pdf, write_results
+from ingest import CHUNK_OVERLAP, CHUNK_SIZE
+from pdf_extract import count_pages, extract_text_from_pdf
+from process_pool import shutdown_process_pool
+
+
+def timed(fn: Callable, repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def stage(samples_ms: List[float], pages: int) -> dict:
+    stats = percentiles(samples_ms)
+    stats["pages_per_sec"] = round(pages / (stats["p50_ms"] / 1000), 1) if stats["p50_ms"] else None
+    return stats
+
+
+def run(pdf: str, repeat: int) -> dict:
+    pages = count_pages(pdf)
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, add_start_index=True
+    )
+    loaded = PyPDFLoader(pdf).load()
+    chunks = splitter.split_documents(loaded)
+
+    return {
+        "pdf": os.path.basename(pdf),
+        "pages": pages,
+        "chunks": len(chunks),
+        "extract_pymupdf": stage(timed(lambda: extract_text_from_pdf(pdf), repeat), pages),
+        "extract_pymupdf_serial": stage(timed(lambda: extract_text_from_pdf(pdf, workers=1), repeat), pages),
+        "extract_pypdf": stage(timed(lambda: PyPDFLoader(pdf).load(), repeat), pages),
+        "split": stage(timed(lambda: splitter.split_documents(loaded), repeat), pages),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pdf", action="append", default=[], help="PDF to measure; repeatable")
+    parser.add_argument("--pages", type=int, action="append", default=[], help="Generate a PDF with this many pages; repeatable")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", default="benchmark_results/pdf.json")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        pdfs = list(args.pdf) + [
+            synthetic_pdf(os.path.join(directory, f"synthetic-{pages}.pdf"), pages)
+            for pages in (args.pages or ([] if args.pdf else [10, 100]))
+        ]
+        try:
+            results = {"repeat": args.repeat, "documents": [run(pdf, args.repeat) for pdf in pdfs]}
+        finally:
+            shutdown_process_pool()
+    write_results(args.out, "pdf", results)
+
+
+if __name__ == "__main__":
+    main()
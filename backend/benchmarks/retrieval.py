@@ -0,0 +1,171 @@
+"""Compare dense, lexical and hybrid retrieval on uploaded PDFs.
+
+    python -m benchmarks.retrieval --pdf notes.pdf --queries 200 --out results/retrieval.json
+    python -m benchmarks.retrieval --pdf notes.pdf --fake-embeddings 80
+
+Queries are generated from the corpus: "keyword" queries use the rarest
+words of a chunk, "sentence" queries use one of its sentences verbatim. A
+query counts as answered when a retrieved chunk is the source chunk or
+contains the query text. Dense and hybrid modes use the configured
+embedding backend. The "context" section compares the prompt context of
+the top ``k`` chunks joined as-is with the packed context built from
+the same question's candidates, once as indexed and once with every
+document uploaded a second time.
+"""
+import argparse
+import os
+import random
+import re
+import tempfile
+import time
+from collections import Counter
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from benchmarks.common import percentiles, write_results
+from benchmarks.fakes import use_fake_embeddings
+from context_packing import CONTEXT_FETCH_K, assemble_context
+from ingest import load_and_split
+from retrieval import MODES, hybrid_search
+from tokens import estimate_tokens
+from vector_store import PersistentVectorStore
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self, underlying: Embeddings):
+        self.underlying = underlying
+        self.query_calls = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.underlying.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        self.query_calls += 1
+        return self.underlying.embed_query(text)
+
+
+def build_queries(texts: List[str], count: int, seed: int) -> List[dict]:
+    rng = random.Random(seed)
+    doc_freq = Counter()
+    for text in texts:
+        doc_freq.update(set(re.findall(r"[a-z]{4,}", text.lower())))
+
+    queries = []
+    for index in rng.sample(range(len(texts)), min(count, len(texts))):
+        text = texts[index]
+        words = sorted(set(re.findall(r"[a-z]{4,}", text.lower())), key=lambda w: (doc_freq[w], w))
+        if len(words) >= 2:
+            queries.append({"kind": "keyword", "query": " ".join(words[:2]), "source": index})
+        sentences = [s.strip() for s in re.split(r"(?<=[.?!])\s+", text) if 40 <= len(s.strip()) <= 200]
+        if sentences:
+            queries.append({"kind": "sentence", "query": rng.choice(sentences), "source": index})
+    return queries
+
+
+def is_hit(query: dict, text: str, source_text: str) -> bool:
+    if text == source_text:
+        return True
+    if query["kind"] == "sentence":
+        return query["query"] in text
+    return all(word in text.lower() for word in query["query"].split())
+
+
+def run(pdfs: List[str], query_count: int, k: int, seed: int, embeddings: Embeddings) -> dict:
+    texts, metadatas = [], []
+    for pdf in pdfs:
+        chunk_texts, chunk_metadatas = load_and_split(pdf, os.path.basename(pdf))
+        texts += chunk_texts
+        metadatas += chunk_metadatas
+
+    counting = CountingEmbeddings(embeddings)
+    with tempfile.TemporaryDirectory() as directory:
+        store = PersistentVectorStore(counting, directory)
+        started = time.perf_counter()
+        store.add_texts(texts, metadatas=metadatas)
+        ingest_s = time.perf_counter() - started
+
+        queries = build_queries(texts, query_count, seed)
+        results = {"chunks": len(texts), "queries": len(queries), "k": k, "ingest_s": round(ingest_s, 3), "modes": {}}
+        for mode in MODES:
+            counting.query_calls = 0
+            latencies, hits, reciprocal_ranks = [], Counter(), Counter()
+            for query in queries:
+                started = time.perf_counter()
+                retrieved = hybrid_search(store, query["query"], k=k, mode=mode)
+                latencies.append((time.perf_counter() - started) * 1000)
+                source_text = texts[query["source"]]
+                for rank, (doc, _) in enumerate(retrieved):
+                    if is_hit(query, doc.page_content, source_text):
+                        hits[query["kind"]] += 1
+                        reciprocal_ranks[query["kind"]] += 1 / (rank + 1)
+                        break
+
+            per_kind = Counter(query["kind"] for query in queries)
+            results["modes"][mode] = {
+                "latency": percentiles(latencies),
+                "embedding_calls": counting.query_calls,
+                **{
+                    kind: {
+                        f"recall@{k}": round(hits[kind] / total, 4),
+                        "mrr": round(reciprocal_ranks[kind] / total, 4),
+                    }
+                    for kind, total in per_kind.items()
+                    if total
+                },
+            }
+        results["context"] = compare_context(store, queries, texts, k)
+        store.add_texts(texts, metadatas=metadatas)
+        results["context_duplicate_uploads"] = compare_context(store, queries, texts, k)
+    return results
+
+
+def compare_context(store: PersistentVectorStore, queries: List[dict], texts: List[str], k: int) -> dict:
+    tokens = {"joined": [], "packed": []}
+    hits = Counter()
+    for query in queries:
+        retrieved = hybrid_search(store, query["query"], k=max(k, CONTEXT_FETCH_K))
+        contexts = {
+            "joined": "\n\n".join(doc.page_content for doc, _ in retrieved[:k]),
+            "packed": assemble_context(store, retrieved)[0],
+        }
+        source_text = texts[query["source"]]
+        for name, context in contexts.items():
+            tokens[name].append(estimate_tokens(context))
+            if source_text in context or is_hit(query, context, source_text):
+                hits[name] += 1
+
+    def summary(name: str) -> dict:
+        values = tokens[name]
+        return {
+            "mean_tokens": round(sum(values) / len(values), 1) if values else 0,
+            "max_tokens": max(values, default=0),
+            "answer_in_context": round(hits[name] / len(queries), 4) if queries else 0,
+        }
+
+    return {name: summary(name) for name in tokens}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pdf", action="append", required=True, help="PDF to index; repeatable")
+    parser.add_argument("--queries", type=int, default=100, help="Chunks to generate queries from")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="benchmark_results/retrieval.json")
+    parser.add_argument(
+        "--fake-embeddings", type=float, metavar="LATENCY_MS",
+        help="Embed with the local Gemini stand-in (see benchmarks.fakes) at this latency",
+    )
+    args = parser.parse_args()
+
+    if args.fake_embeddings is not None:
+        use_fake_embeddings(args.fake_embeddings)
+
+    from llm_config import embeddings
+
+    write_results(args.out, "retrieval", run(args.pdf, args.queries, args.k, args.seed, embeddings))
+
+
+if __name__ == "__main__":
+    main()
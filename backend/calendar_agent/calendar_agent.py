@@ -1,8 +1,8 @@
 from langchain.agents import initialize_agent, Tool
 from langchain.agents.agent_types import AgentType
-from calendar_agent.calendar_agent_tools import get_calendar_events, get_current_day, get_current_year, delete_meeting, get_current_local_time, is_slot_available, schedule_meeting
+from calendar_agent.calendar_agent_tools import get_calendar_events, get_current_day, get_current_year, delete_meeting, get_current_local_time, is_slot_available, schedule_meeting, find_free_slots, schedule_meetings, delete_meetings
 import fitz
-from llm_config import llm, memory
+from llm_config import llm
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -27,6 +27,20 @@ tools = [
         func=is_slot_available,
         description = "Checks if a given time is free in your Google Calendar based on a natural language string like 'Am I available at 7:30 pm?'. If the given time not free, returns the scheduled event (like 'You already have a movie with friends at this time'). Expects one argument: a natural language string with time and timezone."
         ),
+    Tool(
+        name="find_free_slots",
+        func=find_free_slots,
+        description="""
+        Finds open time slots in the calendar in one call. Use it for questions like "When am I free this week for 2 hours?".
+        Parameters:
+            - start_time: ISO 8601 start of the search range. Defaults to now.
+            - end_time: ISO 8601 end of the search range. Defaults to 7 days after start_time.
+            - duration_minutes: Length of the slot needed, e.g., 120.
+            - timezone: The timezone string, e.g., "America/New_York".
+            - limit: How many slots to return. Defaults to 5.
+            - day_start / day_end: Working hours to search within, e.g., "09:00" and "18:00".
+        """
+    ),
     Tool(
         name="schedule_meeting",
         func=schedule_meeting,
@@ -42,6 +56,30 @@ tools = [
             - conference_link:The meeting link for Zoom, Teams, Google Meet, e.g., "https://zoom.us/j/1234567890", "https://teams.microsoft.com/l/meetup-join/19%3ameeting_N2ZlMDA5YzgtZDg0ZC00ZTQ4LTg3YTUtZjUxYmRjYjU5YjVk%40thread.v2/0?context=%7b%22Tid%22%3a%22xxxxxxxx-xxxx-xxxx-xxxx-xxxxxxxxxxxx%22%2c%22Oid%22%3a%22xxxxxxxx-xxxx-xxxx-xxxx-xxxxxxxxxxxx%22%7d", "https://meet.google.com/abc-defg-hij".   
         """
     ),
+    Tool(
+        name="schedule_meetings",
+        func=schedule_meetings,
+        description="""
+        Schedules many calendar events in one call. Use it instead of calling schedule_meeting repeatedly.
+        Either pass "events", a list of objects with the same fields as schedule_meeting, or describe a repeating event:
+            - event_title, start_time, end_time (or duration_minutes), timezone, description, attendees_list, location, conference_link: as in schedule_meeting, for the first occurrence.
+            - recurrence: An RRULE string that ends with COUNT or UNTIL, e.g., "FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR;COUNT=15" for every weekday for 3 weeks. Rules without an end, or with more than 250 occurrences, are rejected.
+        Returns the outcome for each event.
+        """
+    ),
+    Tool(
+        name="delete_meetings",
+        func=delete_meetings,
+        description="""
+        Deletes every calendar event in a time range whose title or attendees match a search text, e.g., "cancel all my meetings with Jen next week".
+        Parameters:
+            - start_time: ISO 8601 start of the range. Example: "2025-07-07T00:00:00-04:00".
+            - end_time: ISO 8601 end of the range. Example: "2025-07-14T00:00:00-04:00".
+            - query: Text to match against the event title and attendee names or emails, e.g., "Jen".
+            - timezone: The timezone string, e.g., "America/New_York".
+        Returns the outcome for each event.
+        """
+    ),
     Tool(
         name="delete_meeting",
         func=delete_meeting,
@@ -78,7 +116,6 @@ agent = initialize_agent(
     tools=tools,
     llm=llm,
     agent_type=AgentType.OPENAI_FUNCTIONS,
-    memory=memory,
     verbose=True,
     system_message=system_message
 )
@@ -1,45 +1,35 @@
 import os
+import re
 from langchain.tools import tool
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 from dateutil.parser import parse
 from dateutil import parser
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
+from dateutil.rrule import rrulestr
 from zoneinfo import ZoneInfo
-import requests
-from llm_config import llm
+from calendar_agent.calendar_service import calendar
+from calendar_agent.free_busy import free_busy
+from metrics import stage, timed_tool
 import json
 
-SCOPES = ['https://www.googleapis.com/auth/calendar']
+# Upper bound on events one bulk tool call may create or delete.
+MAX_BULK_EVENTS = 250
 
 def get_calendar_service():
-    creds = None
+    return calendar.service()
 
-    if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
-    else:
-        flow = InstalledAppFlow.from_client_secrets_file(
-            'credentials.json', SCOPES
-        )
-        creds = flow.run_local_server(port=0)
-        with open('token.json', 'w') as token:
-            token.write(creds.to_json())
-
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-
-    return build('calendar', 'v3', credentials=creds)
+def parse_range_bound(value: str, tz: ZoneInfo) -> datetime:
+    dt = parser.isoparse(value)
+    return dt if dt.tzinfo else dt.replace(tzinfo=tz)
 
+@timed_tool
 def get_current_local_time(timezone: str) -> str:
     tz = ZoneInfo(timezone)
     now = datetime.now(tz)
     time = now.strftime("%H:%M:%S")
     return f"The current local time is {time}"
 
+@timed_tool
 def get_current_day(timezone: str) -> str:
     tz = ZoneInfo(timezone)
     now = datetime.now(tz)
@@ -49,6 +39,7 @@ def get_current_day(timezone: str) -> str:
 
     return f"Today is {day_of_week}, {formatted}, current local time: {current_time}"
 
+@timed_tool
 def get_current_year(timezone: str) -> str:
     tz = ZoneInfo(timezone)
     year = datetime.now(tz).year
@@ -73,15 +64,35 @@ def clamp_end_time_if_needed(start: datetime, end: datetime, grain: str) -> date
         return end  # fallback: use whatever Duckling returned
     
 
+TITLE_QUOTED = re.compile(r'["\u201c\u2018\']([^"\u201d\u2019\']{2,80})["\u201d\u2019\']')
+TITLE_NAMED = re.compile(r"\b(?:called|titled|named)\s+(.+)", re.I)
+TITLE_COMMAND = re.compile(
+    r"^\s*(?:please\s+)?(?:can you\s+)?(?:schedule|book|add|create|set up|put|plan|delete|cancel|remove)\s+"
+    r"(?:(?:a|an|the|my)\s+)?(?:(?:meeting|event)\s+(?:for|about)\s+)?",
+    re.I,
+)
+# Where the title ends and the when/where/who details begin.
+TITLE_END = re.compile(
+    r"\s+(?:at|on|from|for|to|tomorrow|today|tonight|next|this|every|in|between|starting|until|by)\b"
+    r"|\s+\d|[,.?!]",
+    re.I,
+)
+
+
 def extract_event_title(input_text: str) -> str:
-    prompt = f'Extract just the Google Calendar event title from this sentence:\n\n"{input_text}"\n\nTitle:'
-    try:
-        response = llm.invoke(prompt)
-        content = getattr(response, "content", "").strip().strip('"')
-        return content if content else "Meeting"
-    except Exception as e:
+    quoted = TITLE_QUOTED.search(input_text)
+    if quoted:
+        return quoted.group(1).strip()
+
+    named = TITLE_NAMED.search(input_text)
+    text = named.group(1) if named else TITLE_COMMAND.sub("", input_text, count=1)
+    # "with" is deliberately not a boundary: "Lunch with Jen" is a title.
+    title = TITLE_END.split(text, maxsplit=1)[0].strip()
+    if not title or title.lower() in {"a meeting", "meeting", "an event", "event"}:
         return "Meeting"
+    return title[0].upper() + title[1:]
 
+@timed_tool
 def get_calendar_events(input: str):
     try:
         params = json.loads(input)
@@ -93,16 +104,8 @@ def get_calendar_events(input: str):
     timezone = params.get("timezone", "America/New_York")
     
     try:
-        service = get_calendar_service()
-        events_result = service.events().list(
-            calendarId='primary',
-            timeMin=start_time,
-            timeMax=end_time,
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
-
-        events = events_result.get('items', [])
+        tz = ZoneInfo(timezone)
+        events = calendar.events_between(parse_range_bound(start_time, tz), parse_range_bound(end_time, tz))
 
         if not events:
             return "No events found in that time range."
@@ -119,8 +122,8 @@ def get_calendar_events(input: str):
                 formatted_start = start.strftime("%A, %B %d, %Y at %I:%M %p")
                 formatted_end = end.strftime("%A, %B %d, %Y at %I:%M %p")
             except Exception:
-                start = start_str
-                end = end_str
+                formatted_start = start_str
+                formatted_end = end_str
 
             formatted_events.append({
                 "title": event.get("summary", "No title"),
@@ -138,6 +141,7 @@ def get_calendar_events(input: str):
         return {"error": f"Error fetching events: {e}"}
 
 
+@timed_tool
 def is_slot_available(input: str) -> str:
     # Try to extract timezone from input
     timezone = "America/New_York"  # default
@@ -158,14 +162,7 @@ def is_slot_available(input: str) -> str:
         return f"Sorry, I couldn’t understand the time. Error: {e}"
 
     try:
-        service = get_calendar_service()
-        events = service.events().list(
-            calendarId="primary",
-            timeMin=start_dt.isoformat(),
-            timeMax=end_dt.isoformat(),
-            singleEvents=True,
-            orderBy="startTime"
-        ).execute().get("items", [])
+        events = calendar.events_between(start_dt, end_dt)
 
         if not events:
             return f"You are available at {start_dt.strftime('%I:%M %p')} ({timezone})."
@@ -175,45 +172,78 @@ def is_slot_available(input: str) -> str:
         return f"Calendar error: {e}"
 
 
-def schedule_meeting(input: str):
+@timed_tool
+def find_free_slots(input: str):
     try:
         params = json.loads(input)
     except json.JSONDecodeError:
         return "Error: could not parse JSON input."
 
-    attendees_list = []
-    location = ""
-    conference_link = ""
-    description = ""
+    timezone = params.get("timezone", "America/New_York")
+    tz = ZoneInfo(timezone)
+    now = datetime.now(tz)
+
+    try:
+        start_dt = parse_range_bound(params["start_time"], tz) if params.get("start_time") else now
+        end_dt = parse_range_bound(params["end_time"], tz) if params.get("end_time") else start_dt + timedelta(days=7)
+        duration = timedelta(minutes=int(params.get("duration_minutes", 60)))
+        limit = int(params.get("limit", 5))
+    except (ValueError, TypeError) as e:
+        return f"Error: invalid parameters. {e}"
+
+    try:
+        slots = free_busy.free_slots(
+            max(start_dt, now).astimezone(tz),
+            end_dt.astimezone(tz),
+            duration,
+            limit=limit,
+            day_start=params.get("day_start", "09:00"),
+            day_end=params.get("day_end", "18:00"),
+        )
+    except Exception as e:
+        return {"error": f"Error checking availability: {e}"}
+
+    if not slots:
+        return "No free slots of that length found in that time range."
+
+    return {"free_slots": [
+        {
+            "start": start.strftime("%A, %B %d, %Y at %I:%M %p"),
+            "end": end.strftime("%A, %B %d, %Y at %I:%M %p"),
+            "start_time": start.isoformat(),
+            "end_time": end.isoformat(),
+        }
+        for start, end in slots
+    ]}
 
+
+def build_event(params: dict, timezone: str):
     start_time = params.get("start_time")
     end_time = params.get("end_time")
-    timezone = params.get("timezone", "America/New_York")
+    timezone = params.get("timezone", timezone)
     event_title = params.get("event_title")
     attendees_list = params.get("attendees_list", [])  # Should be a list of emails
     location = params.get("location", "")
     conference_link = params.get("conference_link", "")
     description = params.get("description", "")
 
-    if not end_time:
+    if start_time and not end_time:
         start_dt = datetime.fromisoformat(start_time)
-        end_dt = start_dt + timedelta(hours=1)
+        end_dt = start_dt + timedelta(minutes=int(params.get("duration_minutes", 60)))
         end_time = end_dt.isoformat()
-        
+
     if not start_time or not end_time or not event_title:
-        return "Error: start_time, end_time, and event_title are required."
+        raise ValueError("start_time, end_time, and event_title are required.")
 
-    if isinstance(attendees_list, str) & len(attendees_list) > 1:
+    if isinstance(attendees_list, str):
         attendees_list = [email.strip() for email in attendees_list.split(",") if email.strip()]
 
     attendees = []
     for email in attendees_list: 
         attendees.append({"email": email})
 
-    service = get_calendar_service()
-    
     full_description = f"{description}{' | Link: ' + conference_link if conference_link else ''}" 
-    event = {
+    return {
         "summary": event_title,
         "start": {"dateTime": start_time, "timeZone": timezone},
         "end": {"dateTime": end_time, "timeZone": timezone},
@@ -222,14 +252,33 @@ def schedule_meeting(input: str):
         "description": full_description
     }
 
+
+@timed_tool
+def schedule_meeting(input: str):
     try:
-        created = service.events().insert(calendarId="primary", body=event, sendUpdates="all").execute()
+        params = json.loads(input)
+    except json.JSONDecodeError:
+        return "Error: could not parse JSON input."
+
+    try:
+        event = build_event(params, "America/New_York")
+    except ValueError as e:
+        return f"Error: {e}"
+
+    service = get_calendar_service()
+
+    try:
+        with stage("calendar_api"):
+            created = service.events().insert(calendarId="primary", body=event, sendUpdates="all").execute()
+        calendar.remember(created)
+        free_busy.invalidate()
         return f"Meeting '{event}' scheduled: {created.get('htmlLink')}"
     except Exception as e:
 
         return f"Calendar error: {event}"
 
 
+@timed_tool
 def delete_meeting(input: str):
     
     try:
@@ -249,24 +298,158 @@ def delete_meeting(input: str):
     if not start_time or not event_title:
         return "Error: start_time and event_title are required."
 
-    service = get_calendar_service()
-    events_result = service.events().list(
-        calendarId='primary',
-        timeMin=start_time,
-        timeMax=end_time,
-        singleEvents=True,
-        orderBy='startTime'
-    ).execute()
-
-    events = events_result.get('items', [])
+    tz = ZoneInfo(timezone)
+    events = calendar.events_between(parse_range_bound(start_time, tz), parse_range_bound(end_time, tz))
 
+    service = get_calendar_service()
     for event in events:
         if event.get('summary', '').lower() == event_title.lower():
             event_id = event['id']
             try:
-                service.events().delete(calendarId='primary', eventId=event_id).execute()
+                with stage("calendar_api"):
+                    service.events().delete(calendarId='primary', eventId=event_id).execute()
+                calendar.forget(event_id)
+                free_busy.invalidate()
                 return f"Meeting '{event_title}' at {start_time} was deleted."
             except Exception as e:
                 return f"Error deleting event: {e}"
 
-    return f"No matching event found for '{event_title}' at {start_time}."
\ No newline at end of file
+    return f"No matching event found for '{event_title}' at {start_time}."
+
+
+def expand_recurrence(params: dict) -> list:
+    """Turn one event with an RRULE into a list of single-event params.
+
+    The rule must end (COUNT or UNTIL). Expansion stops one past
+    MAX_BULK_EVENTS so the caller rejects oversized rules instead of
+    silently creating only the first ones.
+    """
+    recurrence = params["recurrence"].removeprefix("RRULE:")
+    parts = {part.split("=", 1)[0].strip().upper() for part in recurrence.split(";") if part.strip()}
+    if not parts & {"COUNT", "UNTIL"}:
+        raise ValueError("the RRULE must end; add COUNT or UNTIL.")
+    start_dt = datetime.fromisoformat(params["start_time"])
+    if params.get("end_time"):
+        duration = datetime.fromisoformat(params["end_time"]) - start_dt
+    else:
+        duration = timedelta(minutes=int(params.get("duration_minutes", 60)))
+
+    rule = rrulestr(recurrence, dtstart=start_dt)
+    occurrences = []
+    for occurrence in rule:
+        if len(occurrences) > MAX_BULK_EVENTS:
+            break
+        occurrences.append({
+            **params,
+            "start_time": occurrence.isoformat(),
+            "end_time": (occurrence + duration).isoformat(),
+        })
+    return occurrences
+
+
+@timed_tool
+def schedule_meetings(input: str):
+    try:
+        params = json.loads(input)
+    except json.JSONDecodeError:
+        return "Error: could not parse JSON input."
+
+    timezone = params.get("timezone", "America/New_York")
+    try:
+        items = params.get("events") or []
+        if params.get("recurrence"):
+            items = items + expand_recurrence(params)
+    except (KeyError, ValueError) as e:
+        return f"Error: invalid recurrence. {e}"
+    if not items:
+        return "Error: provide a list of events or a recurrence."
+    if len(items) > MAX_BULK_EVENTS:
+        return f"Error: at most {MAX_BULK_EVENTS} events can be scheduled at once."
+
+    results = [None] * len(items)
+    inserts, positions = [], []
+    service = get_calendar_service()
+    for i, item in enumerate(items):
+        try:
+            event = build_event(item, timezone)
+        except ValueError as e:
+            results[i] = {"event_title": item.get("event_title"), "start_time": item.get("start_time"), "error": str(e)}
+            continue
+        inserts.append(service.events().insert(calendarId="primary", body=event, sendUpdates="all"))
+        positions.append(i)
+
+    try:
+        responses = calendar.execute_batch(inserts)
+    except Exception as e:
+        return {"error": f"Calendar error: {e}"}
+
+    for i, (created, error) in zip(positions, responses):
+        item = items[i]
+        result = {"event_title": item.get("event_title"), "start_time": item.get("start_time")}
+        if error is not None:
+            result["error"] = str(error)
+        else:
+            calendar.remember(created)
+            result["link"] = created.get("htmlLink")
+        results[i] = result
+    free_busy.invalidate()
+
+    scheduled = sum(1 for result in results if "error" not in result)
+    return {"scheduled": scheduled, "failed": len(results) - scheduled, "results": results}
+
+
+@timed_tool
+def delete_meetings(input: str):
+    try:
+        params = json.loads(input)
+    except json.JSONDecodeError:
+        return "Error: could not parse JSON input."
+
+    start_time = params.get("start_time")
+    end_time = params.get("end_time")
+    query = (params.get("query") or "").lower()
+    if not start_time or not end_time or not query:
+        return "Error: start_time, end_time, and query are required."
+
+    tz = ZoneInfo(params.get("timezone", "America/New_York"))
+    try:
+        events = calendar.events_between(parse_range_bound(start_time, tz), parse_range_bound(end_time, tz))
+    except Exception as e:
+        return {"error": f"Error fetching events: {e}"}
+
+    def matches(event):
+        attendees = event.get("attendees", [])
+        fields = [event.get("summary", "")]
+        fields += [att.get("email", "") for att in attendees] + [att.get("displayName", "") for att in attendees]
+        return any(query in field.lower() for field in fields)
+
+    matched = [event for event in events if matches(event)]
+    skipped = max(0, len(matched) - MAX_BULK_EVENTS)
+    matched = matched[:MAX_BULK_EVENTS]
+    if not matched:
+        return f"No matching events found for '{query}' between {start_time} and {end_time}."
+
+    service = get_calendar_service()
+    deletes = [service.events().delete(calendarId="primary", eventId=event["id"]) for event in matched]
+    try:
+        responses = calendar.execute_batch(deletes)
+    except Exception as e:
+        return {"error": f"Calendar error: {e}"}
+
+    results = []
+    for event, (_, error) in zip(matched, responses):
+        start = event["start"].get("dateTime", event["start"].get("date"))
+        result = {"event_title": event.get("summary", "No title"), "start_time": start}
+        if error is not None:
+            result["error"] = str(error)
+        else:
+            calendar.forget(event["id"])
+        results.append(result)
+    free_busy.invalidate()
+
+    deleted = sum(1 for result in results if "error" not in result)
+    outcome = {"deleted": deleted, "failed": len(results) - deleted, "results": results}
+    if skipped:
+        outcome["not_deleted"] = skipped
+        outcome["note"] = f"Only the first {MAX_BULK_EVENTS} matching events were deleted; {skipped} remain."
+    return outcome
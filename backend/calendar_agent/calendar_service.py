@@ -0,0 +1,227 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from dateutil import parser
+from google.auth.credentials import AnonymousCredentials
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import BatchHttpRequest
+
+from metrics import stage
+
+SCOPES = ['https://www.googleapis.com/auth/calendar']
+
+TOKEN_PATH = os.getenv("GOOGLE_TOKEN_PATH", "token.json")
+CREDENTIALS_PATH = os.getenv("GOOGLE_CREDENTIALS_PATH", "credentials.json")
+# Point the client at a fake Calendar server, e.g. "http://127.0.0.1:8080/calendar/v3/".
+# Requests are then sent without credentials.
+CALENDAR_API_ENDPOINT = os.getenv("GOOGLE_CALENDAR_API_ENDPOINT")
+# Refresh the access token this long before it expires so no call goes out
+# with a token that is about to be rejected.
+TOKEN_REFRESH_MARGIN = timedelta(seconds=int(os.getenv("GOOGLE_TOKEN_REFRESH_MARGIN", "300")))
+# Reads within this many seconds of the last sync are answered locally.
+EVENT_SYNC_INTERVAL = float(os.getenv("CALENDAR_SYNC_INTERVAL", "30"))
+DEFAULT_TIMEZONE = "America/New_York"
+# Calendar rejects batches larger than this.
+CALENDAR_BATCH_SIZE = 50
+
+
+class GoogleCalendar:
+    """Process-wide Calendar API client with a locally synced event cache.
+
+    Credentials are loaded once and refreshed ahead of expiry. Discovery
+    clients are built once per thread because the underlying httplib2
+    transport is not thread-safe.
+
+    Events for ``calendar_id`` are mirrored in memory. The first read does a
+    full ``events.list``; later reads send the stored ``syncToken`` and only
+    apply what changed, at most once every ``sync_interval`` seconds.
+    """
+
+    def __init__(
+        self,
+        calendar_id: str = "primary",
+        sync_interval: float = EVENT_SYNC_INTERVAL,
+        api_endpoint: Optional[str] = CALENDAR_API_ENDPOINT,
+    ):
+        self.calendar_id = calendar_id
+        self.sync_interval = sync_interval
+        self.api_endpoint = api_endpoint
+        self.full_syncs = 0
+        self.incremental_syncs = 0
+        self._creds = None
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._events: Dict[str, dict] = {}
+        self._spans: Dict[str, Tuple[datetime, datetime]] = {}
+        self._sync_token: Optional[str] = None
+        self._synced_at = 0.0
+
+    def credentials(self):
+        with self._lock:
+            if self.api_endpoint:
+                if self._creds is None:
+                    self._creds = AnonymousCredentials()
+                return self._creds
+
+            if self._creds is None:
+                if os.path.exists(TOKEN_PATH):
+                    self._creds = Credentials.from_authorized_user_file(TOKEN_PATH, SCOPES)
+                else:
+                    flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_PATH, SCOPES)
+                    self._creds = flow.run_local_server(port=0)
+                    self._save_token()
+
+            creds = self._creds
+            expiring = creds.expiry is not None and creds.expiry - datetime.utcnow() < TOKEN_REFRESH_MARGIN
+            if (not creds.valid or expiring) and creds.refresh_token:
+                creds.refresh(Request())
+                self._save_token()
+            return creds
+
+    def _save_token(self):
+        with open(TOKEN_PATH, 'w') as token:
+            token.write(self._creds.to_json())
+
+    def service(self):
+        creds = self.credentials()
+        service = getattr(self._local, "service", None)
+        if service is None:
+            client_options = {"api_endpoint": self.api_endpoint} if self.api_endpoint else None
+            service = build(
+                'calendar', 'v3', credentials=creds, client_options=client_options, static_discovery=True
+            )
+            self._local.service = service
+        return service
+
+    def new_batch(self, callback=None) -> BatchHttpRequest:
+        if self.api_endpoint:
+            # The discovery client builds batch URLs from the real root URL.
+            root = self.api_endpoint.split("/calendar/v3")[0].rstrip("/")
+            return BatchHttpRequest(callback=callback, batch_uri=f"{root}/batch/calendar/v3")
+        return self.service().new_batch_http_request(callback=callback)
+
+    def execute_batch(self, requests: list) -> List[Tuple[Optional[dict], Optional[Exception]]]:
+        """Send prepared API requests as multipart batches of up to 50.
+
+        Returns one ``(response, error)`` pair per request, in order.
+        """
+        results: List[Tuple[Optional[dict], Optional[Exception]]] = [(None, None)] * len(requests)
+
+        def on_response(request_id, response, exception):
+            results[int(request_id)] = (response, exception)
+
+        for offset in range(0, len(requests), CALENDAR_BATCH_SIZE):
+            batch = self.new_batch(on_response)
+            for index in range(offset, min(offset + CALENDAR_BATCH_SIZE, len(requests))):
+                batch.add(requests[index], request_id=str(index))
+            with stage("calendar_api"):
+                batch.execute()
+        return results
+
+    def sync(self, force: bool = False):
+        """Bring the local event copy up to date with the server."""
+        with self._lock:
+            if not force and self._sync_token and time.monotonic() - self._synced_at < self.sync_interval:
+                return
+            try:
+                self._pull(self._sync_token)
+            except HttpError as e:
+                # 410 Gone: the sync token expired, start over.
+                if e.resp.status != 410:
+                    raise
+                self._sync_token = None
+                self._pull(None)
+            self._synced_at = time.monotonic()
+
+    def _pull(self, sync_token: Optional[str]):
+        events = self.service().events()
+        if sync_token is None:
+            self._events.clear()
+            self._spans.clear()
+            self.full_syncs += 1
+        else:
+            self.incremental_syncs += 1
+
+        page_token = None
+        while True:
+            params = {"calendarId": self.calendar_id, "singleEvents": True, "maxResults": 2500}
+            if page_token:
+                params["pageToken"] = page_token
+            if sync_token:
+                params["syncToken"] = sync_token
+            with stage("calendar_api"):
+                result = events.list(**params).execute()
+            for event in result.get("items", []):
+                self._apply(event)
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                self._sync_token = result.get("nextSyncToken")
+                return
+
+    def _apply(self, event: dict):
+        event_id = event["id"]
+        if event.get("status") == "cancelled":
+            self._events.pop(event_id, None)
+            self._spans.pop(event_id, None)
+            return
+        span = event_span(event)
+        if span is None:
+            return
+        self._events[event_id] = event
+        self._spans[event_id] = span
+
+    def remember(self, event: dict):
+        """Write-through for events this process created or changed."""
+        with self._lock:
+            self._apply(event)
+
+    def forget(self, event_id: str):
+        with self._lock:
+            self._events.pop(event_id, None)
+            self._spans.pop(event_id, None)
+
+    def events_between(self, start: datetime, end: datetime) -> List[dict]:
+        """Cached events overlapping ``[start, end)``, ordered by start time."""
+        self.sync()
+        with self._lock:
+            found = [
+                (span[0], self._events[event_id])
+                for event_id, span in self._spans.items()
+                if span[0] < end and span[1] > start
+            ]
+        found.sort(key=lambda item: item[0])
+        return [event for _, event in found]
+
+    def stats(self) -> dict:
+        return {
+            "events": len(self._events),
+            "full_syncs": self.full_syncs,
+            "incremental_syncs": self.incremental_syncs,
+        }
+
+
+def event_span(event: dict, timezone: str = DEFAULT_TIMEZONE) -> Optional[Tuple[datetime, datetime]]:
+    try:
+        start = _event_time(event["start"], timezone)
+        end = _event_time(event["end"], timezone)
+    except (KeyError, ValueError):
+        return None
+    return start, end
+
+
+def _event_time(value: dict, timezone: str) -> datetime:
+    dt = parser.isoparse(value.get("dateTime") or value["date"])
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=ZoneInfo(value.get("timeZone") or timezone))
+    return dt
+
+
+calendar = GoogleCalendar()
@@ -0,0 +1,155 @@
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import Iterator, List, Tuple
+
+from dateutil import parser
+
+from calendar_agent.calendar_service import GoogleCalendar, calendar
+from metrics import stage
+
+# Google caps the range of a single freeBusy query, so longer spans are split.
+FREEBUSY_MAX_SPAN = timedelta(days=60)
+FREEBUSY_TTL = float(os.getenv("CALENDAR_FREEBUSY_TTL", "60"))
+
+Interval = Tuple[datetime, datetime]
+
+
+class IntervalSet:
+    """Sorted, merged, non-overlapping intervals with bisect lookups."""
+
+    def __init__(self):
+        self.starts: List[datetime] = []
+        self.ends: List[datetime] = []
+
+    def __len__(self):
+        return len(self.starts)
+
+    def add(self, start: datetime, end: datetime):
+        if end <= start:
+            return
+        # Every interval touching [start, end] is folded into one.
+        i = bisect_left(self.ends, start)
+        j = bisect_right(self.starts, end)
+        if i < j:
+            start = min(start, self.starts[i])
+            end = max(end, self.ends[j - 1])
+        self.starts[i:j] = [start]
+        self.ends[i:j] = [end]
+
+    def overlapping(self, start: datetime, end: datetime) -> List[Interval]:
+        i = bisect_right(self.ends, start)
+        found = []
+        while i < len(self.starts) and self.starts[i] < end:
+            found.append((self.starts[i], self.ends[i]))
+            i += 1
+        return found
+
+    def gaps(self, start: datetime, end: datetime) -> Iterator[Interval]:
+        """Uncovered stretches of ``[start, end)`` in order."""
+        cursor = start
+        for busy_start, busy_end in self.overlapping(start, end):
+            if busy_start > cursor:
+                yield cursor, busy_start
+            cursor = max(cursor, busy_end)
+        if cursor < end:
+            yield cursor, end
+
+
+class FreeBusyIndex:
+    """Busy blocks for one calendar, filled by bulk ``freebusy.query`` calls.
+
+    Ranges that were already fetched are remembered, so repeated
+    availability checks over the same days cost no API calls until the
+    index is older than ``ttl`` seconds or is invalidated by a write.
+    """
+
+    def __init__(self, calendar: GoogleCalendar, ttl: float = FREEBUSY_TTL):
+        self.calendar = calendar
+        self.ttl = ttl
+        self.queries = 0
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._busy = IntervalSet()
+        self._covered = IntervalSet()
+        self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._reset()
+
+    def busy(self, start: datetime, end: datetime) -> List[Interval]:
+        with self._lock:
+            if time.monotonic() - self._loaded_at > self.ttl:
+                self._reset()
+            for gap_start, gap_end in list(self._covered.gaps(start, end)):
+                self._fetch(gap_start, gap_end)
+            return self._busy.overlapping(start, end)
+
+    def _fetch(self, start: datetime, end: datetime):
+        freebusy = self.calendar.service().freebusy()
+        while start < end:
+            stop = min(end, start + FREEBUSY_MAX_SPAN)
+            with stage("calendar_api"):
+                result = freebusy.query(body={
+                    "timeMin": start.isoformat(),
+                    "timeMax": stop.isoformat(),
+                    "items": [{"id": self.calendar.calendar_id}],
+                }).execute()
+            self.queries += 1
+            blocks = result.get("calendars", {}).get(self.calendar.calendar_id, {}).get("busy", [])
+            for block in blocks:
+                self._busy.add(parser.isoparse(block["start"]), parser.isoparse(block["end"]))
+            self._covered.add(start, stop)
+            start = stop
+
+    def is_free(self, start: datetime, end: datetime) -> bool:
+        return not self.busy(start, end)
+
+    def free_slots(
+        self,
+        start: datetime,
+        end: datetime,
+        duration: timedelta,
+        limit: int = 5,
+        day_start: str = "09:00",
+        day_end: str = "18:00",
+        granularity: timedelta = timedelta(minutes=15),
+    ) -> List[Interval]:
+        """The first ``limit`` open slots of ``duration`` within working hours.
+
+        One slot is offered per free gap, starting on a ``granularity``
+        boundary, so the suggestions are spread over the range.
+        """
+        busy = IntervalSet()
+        for block in self.busy(start, end):
+            busy.add(*block)
+
+        open_hour, open_minute = map(int, day_start.split(":"))
+        close_hour, close_minute = map(int, day_end.split(":"))
+        slots = []
+        day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        while day < end and len(slots) < limit:
+            window_start = max(start, day.replace(hour=open_hour, minute=open_minute))
+            window_end = min(end, day.replace(hour=close_hour, minute=close_minute))
+            for gap_start, gap_end in busy.gaps(window_start, window_end):
+                slot_start = _round_up(gap_start, granularity)
+                if slot_start + duration <= gap_end:
+                    slots.append((slot_start, slot_start + duration))
+                    if len(slots) == limit:
+                        break
+            day += timedelta(days=1)
+        return slots
+
+
+def _round_up(dt: datetime, step: timedelta) -> datetime:
+    midnight = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    remainder = (dt - midnight) % step
+    return dt if not remainder else dt + (step - remainder)
+
+
+free_busy = FreeBusyIndex(calendar)
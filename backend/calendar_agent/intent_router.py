@@ -0,0 +1,162 @@
+import re
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from calendar_agent.calendar_agent_tools import get_current_day, get_current_local_time, get_current_year
+from calendar_agent.calendar_service import calendar, event_span
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+_WEEKDAY = "|".join(WEEKDAYS)
+
+# Questions that change the calendar always go to the agent.
+WRITE_WORDS = re.compile(
+    r"\b(schedule|book|add|create|set up|put|cancel|delete|remove|move|reschedule|invite|clear)\b", re.I
+)
+# The fast path only takes questions that are, as a whole, one of these
+# trivial forms (see ``normalize``); anything more, such as a place, a
+# timezone or a person, goes to the agent.
+TIME_QUESTION = re.compile(
+    r"what time is it( now| right now)?|what('s| is) the (current |local )?time( now| right now)?"
+    r"|(current|local) time|time now"
+)
+YEAR_QUESTION = re.compile(r"(what|which) year is (it|this)( now)?|what('s| is) the (current )?year|current year")
+TODAY_QUESTION = re.compile(
+    r"what('s| is) (the date|the day|today's date)( today)?|what (day|date) is (it|today)( today)?|today's date"
+)
+# The rest of the question must be exactly one phrase ``resolve_dates`` understands.
+DAY_OF_QUESTION = re.compile(r"what('s| is)? (the )?(date|day)( is it| is| will it be| will be)?( on)? (?P<when>.+)")
+AGENDA_QUESTION = re.compile(
+    r"(what('s| is)|what do i have|what (meetings|events|plans) do i have|do i have (any|anything)|show( me)?|list|any)"
+    r"( (on )?my (calendar|schedule|agenda)| (my )?(meetings|events|plans))?"
+    r"( (for|on))? (?P<when>.+)"
+)
+
+DateRange = Tuple[datetime, datetime]
+
+
+def _day_range(day: date, tz: ZoneInfo, days: int = 1) -> DateRange:
+    start = datetime(day.year, day.month, day.day, tzinfo=tz)
+    return start, start + timedelta(days=days)
+
+
+def resolve_dates(question: str, now: datetime) -> List[Tuple[str, DateRange]]:
+    """Relative date phrases in ``question`` with the day range each refers to."""
+    tz = now.tzinfo
+    today = now.date()
+    monday = today - timedelta(days=today.weekday())
+    found = []
+
+    def add(match: re.Match, day: date, days: int = 1):
+        found.append((match.group(0), _day_range(day, tz, days)))
+
+    for match in re.finditer(r"\bday after tomorrow\b", question, re.I):
+        add(match, today + timedelta(days=2))
+    for match in re.finditer(r"\b(?<!after )(today|tonight|tomorrow|yesterday)\b", question, re.I):
+        offset = {"today": 0, "tonight": 0, "tomorrow": 1, "yesterday": -1}[match.group(1).lower()]
+        add(match, today + timedelta(days=offset))
+    for match in re.finditer(r"\b(this|next) week(end)?\b", question, re.I):
+        start = monday + timedelta(weeks=1 if match.group(1).lower() == "next" else 0)
+        if match.group(2):
+            add(match, start + timedelta(days=5), 2)
+        else:
+            add(match, start, 7)
+    for match in re.finditer(r"\bin (\d+) (day|week)s?\b", question, re.I):
+        amount = int(match.group(1)) * (7 if match.group(2).lower() == "week" else 1)
+        add(match, today + timedelta(days=amount))
+    for match in re.finditer(rf"\b(?:(this|next|on) )?({_WEEKDAY})\b", question, re.I):
+        weekday = WEEKDAYS.index(match.group(2).lower())
+        if (match.group(1) or "").lower() == "next":
+            # "next friday" means the friday of next week, even when said on a monday.
+            add(match, monday + timedelta(weeks=1, days=weekday))
+        else:
+            add(match, today + timedelta(days=(weekday - today.weekday()) % 7))
+    return found
+
+
+def describe_dates(resolved: List[Tuple[str, DateRange]]) -> str:
+    parts = []
+    for phrase, (start, end) in resolved:
+        last = (end - timedelta(days=1)).date()
+        if last == start.date():
+            parts.append(f'"{phrase}" = {start.strftime("%A, %Y-%m-%d")}')
+        else:
+            parts.append(f'"{phrase}" = {start.strftime("%A, %Y-%m-%d")} to {last.strftime("%A, %Y-%m-%d")}')
+    return "; ".join(parts)
+
+
+def calendar_span(event: dict, tz: ZoneInfo) -> Optional[DateRange]:
+    span = event_span(event, str(tz))
+    return None if span is None else (span[0].astimezone(tz), span[1].astimezone(tz))
+
+
+def _format_agenda(phrase: str, events: List[dict], tz: ZoneInfo) -> str:
+    if not events:
+        return f"You have no events {phrase}."
+    lines = []
+    for event in events:
+        span = calendar_span(event, tz)
+        title = event.get("summary", "No title")
+        if span is None:
+            lines.append(f"- {title}")
+        elif "date" in event["start"]:
+            lines.append(f"- {title} on {span[0].strftime('%A, %B %d')} (all day)")
+        else:
+            lines.append(
+                f"- {title} on {span[0].strftime('%A, %B %d')} from "
+                f"{span[0].strftime('%I:%M %p')} to {span[1].strftime('%I:%M %p')}"
+            )
+    noun = "event" if len(events) == 1 else "events"
+    return f"You have {len(events)} {noun} {phrase}:\n" + "\n".join(lines)
+
+
+def normalize(question: str) -> str:
+    return re.sub(r"\s+", " ", question.strip().lower().replace("\u2019", "'")).rstrip("?.! ")
+
+
+def _single_date(when: str, now: datetime) -> Optional[Tuple[str, DateRange]]:
+    """The date range ``when`` names, if all of it is one relative date phrase."""
+    resolved = resolve_dates(when, now)
+    if len(resolved) == 1 and resolved[0][0].lower() == when:
+        return resolved[0]
+    return None
+
+
+def fast_answer(question: str, timezone: str, now: Optional[datetime] = None) -> Optional[str]:
+    """Answer trivial date/time and agenda questions without the LLM agent.
+
+    Returns None when the question needs the agent.
+    """
+    tz = ZoneInfo(timezone)
+    now = now or datetime.now(tz)
+    text = normalize(question)
+    if WRITE_WORDS.search(text):
+        return None
+
+    if TIME_QUESTION.fullmatch(text):
+        return get_current_local_time(timezone)
+    if YEAR_QUESTION.fullmatch(text):
+        return get_current_year(timezone)
+    if TODAY_QUESTION.fullmatch(text):
+        return get_current_day(timezone)
+
+    match = DAY_OF_QUESTION.fullmatch(text)
+    if match:
+        resolved = _single_date(match.group("when"), now)
+        if resolved is not None and resolved[1][1] - resolved[1][0] == timedelta(days=1):
+            phrase, (start, _) = resolved
+            return f"{phrase[0].upper() + phrase[1:]} is {start.strftime('%A, %B %d, %Y')}."
+        return None
+
+    match = AGENDA_QUESTION.fullmatch(text)
+    if match:
+        resolved = _single_date(match.group("when"), now)
+        if resolved is None:
+            return None
+        phrase, (start, end) = resolved
+        try:
+            events = calendar.events_between(start, end)
+        except Exception:
+            return None
+        return _format_agenda(phrase, events, tz)
+    return None
@@ -0,0 +1,106 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Optional
+
+from map_reduce import MAP_REDUCE_CHUNK_TOKENS, MAP_REDUCE_THRESHOLD_TOKENS
+from pdf_extract import PDF_MAX_CHARS, PDF_MAX_PAGES
+from sqlite_cache import SqliteLRUCache
+
+CHAT_CACHE_PATH = os.getenv("CHAT_CACHE_PATH", "./chat_cache.sqlite3")
+CHAT_CACHE_MAX_ENTRIES = int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "5000"))
+CHAT_CACHE_MEMORY_ENTRIES = int(os.getenv("CHAT_CACHE_MEMORY_ENTRIES", "256"))
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Bump whenever the /chat action prompts or the map-reduce prompts change so
+# stale answers are not served for the new prompts.
+PROMPT_VERSION = "1"
+# Settings that change the answer for the same file and prompt, so that
+# changing any of them does not serve answers computed under the old value.
+OUTPUT_SETTINGS = (
+    f"pdf_max_pages={PDF_MAX_PAGES};pdf_max_chars={PDF_MAX_CHARS};"
+    f"map_reduce_threshold={MAP_REDUCE_THRESHOLD_TOKENS};map_reduce_chunk={MAP_REDUCE_CHUNK_TOKENS}"
+)
+
+
+class TwoTierCache:
+    """In-process LRU in front of a ``SqliteLRUCache``, both with a TTL."""
+
+    def __init__(self, disk: SqliteLRUCache, memory_entries: int, ttl: float):
+        self.disk = disk
+        self.memory_entries = memory_entries
+        self.ttl = ttl
+        self.memory_hits = 0
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if time.time() - created_at <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+
+        value = self.disk.get(key)
+        if value is None:
+            return None
+        value = value.decode("utf-8")
+        self._remember(key, value)
+        return value
+
+    def set(self, key: str, value: str):
+        self.disk.set(key, value.encode("utf-8"))
+        self._remember(key, value)
+
+    def _remember(self, key: str, value: str):
+        with self._lock:
+            self._memory[key] = (time.time(), value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        disk = self.disk.stats()
+        lookups = self.memory_hits + disk["hits"] + disk["misses"]
+        return {
+            "memory_entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "disk_entries": disk["entries"],
+            "disk_hits": disk["hits"],
+            "hits": self.memory_hits + disk["hits"],
+            "misses": disk["misses"],
+            "hit_ratio": (self.memory_hits + disk["hits"]) / lookups if lookups else 0.0,
+            "evictions": disk["evictions"],
+        }
+
+
+def chat_cache_key(file_hash: str, action: str, model: str) -> str:
+    key = f"{file_hash}\0{action}\0{model}\0{PROMPT_VERSION}\0{OUTPUT_SETTINGS}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+async def record_stream(chunks: AsyncIterator[str], cache: TwoTierCache, key: str) -> AsyncIterator[str]:
+    parts = []
+    async for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    # Only complete streams reach this point; errors propagate past it.
+    await asyncio.to_thread(cache.set, key, "".join(parts))
+
+
+async def replay(value: str) -> AsyncIterator[str]:
+    yield value
+
+
+chat_cache = TwoTierCache(
+    SqliteLRUCache(CHAT_CACHE_PATH, max_entries=CHAT_CACHE_MAX_ENTRIES, ttl=CHAT_CACHE_TTL),
+    memory_entries=CHAT_CACHE_MEMORY_ENTRIES,
+    ttl=CHAT_CACHE_TTL,
+)
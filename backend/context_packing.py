@@ -0,0 +1,169 @@
+import os
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from tokens import CHARS_PER_TOKEN, estimate_tokens
+from vector_store import PersistentVectorStore
+
+# Upper bound on the context placed in a RAG prompt. Four unpacked
+# 1000-character chunks came to about this much.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1000"))
+# Chunks retrieved as packing candidates, and how many of them may end up
+# in the prompt once merged and diversified.
+CONTEXT_FETCH_K = int(os.getenv("CONTEXT_FETCH_K", "8"))
+CONTEXT_MAX_CHUNKS = int(os.getenv("CONTEXT_MAX_CHUNKS", "4"))
+# 1.0 ranks by relevance only; lower values favour passages unlike those already chosen.
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+# Passages at least this similar to one already chosen are dropped as duplicates,
+# e.g. the same file uploaded twice.
+DUPLICATE_SIMILARITY = float(os.getenv("CONTEXT_DUPLICATE_SIMILARITY", "0.97"))
+
+
+@dataclass
+class Passage:
+    text: str
+    metadata: dict
+    score: float
+    chunk_ids: List[str] = field(default_factory=list)
+    start: Optional[int] = None
+
+    @property
+    def end(self) -> Optional[int]:
+        return None if self.start is None else self.start + len(self.text)
+
+    @property
+    def label(self) -> str:
+        source = self.metadata.get("source") or "document"
+        page = self.metadata.get("page_label") or (
+            self.metadata["page"] + 1 if isinstance(self.metadata.get("page"), int) else None
+        )
+        return f"{source}, page {page}" if page is not None else source
+
+
+def merge_adjacent(retrieved: List[Tuple[Document, float]]) -> List[Passage]:
+    """Join chunks that overlap or touch on the same page into one passage.
+
+    Relies on the ``start_index`` the splitter records; chunks without it
+    are kept as they are. Passages come back best score first.
+    """
+    passages, spans = [], {}
+    for doc, score in retrieved:
+        passage = Passage(doc.page_content, doc.metadata, score, [doc.id], doc.metadata.get("start_index"))
+        if passage.start is None:
+            passages.append(passage)
+        else:
+            spans.setdefault((doc.metadata.get("doc_id"), doc.metadata.get("page")), []).append(passage)
+
+    for group in spans.values():
+        group.sort(key=lambda p: p.start)
+        current = group[0]
+        for passage in group[1:]:
+            gap = passage.start - current.end
+            if gap > 1:
+                passages.append(current)
+                current = passage
+                continue
+            if gap >= 0:
+                current.text += " " * gap + passage.text
+            elif passage.end > current.end:
+                current.text += passage.text[current.end - passage.start:]
+            current.score = max(current.score, passage.score)
+            current.chunk_ids += passage.chunk_ids
+        passages.append(current)
+    return sorted(passages, key=lambda p: p.score, reverse=True)
+
+
+def mmr_order(
+    passages: List[Passage],
+    vectors: np.ndarray,
+    lambda_mult: float = MMR_LAMBDA,
+    duplicate_similarity: float = DUPLICATE_SIMILARITY,
+) -> List[Passage]:
+    """Order passages by maximal marginal relevance, dropping near-duplicates.
+
+    Relevance is the retrieval score scaled to [0, 1], so it works with
+    cosine, BM25 and fused scores alike; redundancy is the cosine
+    similarity to the passages already picked.
+    """
+    if len(passages) < 2:
+        return list(passages)
+    scores = np.array([p.score for p in passages], dtype=np.float32)
+    spread = scores.max() - scores.min()
+    relevance = (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+    similarity = vectors @ vectors.T
+
+    order = [int(np.argmax(relevance))]
+    redundancy = similarity[order[0]].copy()
+    remaining = set(range(len(passages))) - set(order)
+    while remaining:
+        candidates = sorted(remaining)
+        marginal = lambda_mult * relevance[candidates] - (1 - lambda_mult) * redundancy[candidates]
+        best = candidates[int(np.argmax(marginal))]
+        remaining.remove(best)
+        if redundancy[best] >= duplicate_similarity:
+            continue
+        order.append(best)
+        redundancy = np.maximum(redundancy, similarity[best])
+    return [passages[i] for i in order]
+
+
+def format_passage(number: int, passage: Passage) -> str:
+    return f"[{number}] {passage.label}\n{passage.text}"
+
+
+def pack(
+    passages: List[Passage], budget: int = CONTEXT_TOKEN_BUDGET, max_chunks: int = CONTEXT_MAX_CHUNKS
+) -> List[Passage]:
+    """Keep passages in order while they fit ``budget`` and ``max_chunks``.
+
+    The first passage is truncated if it alone is over the budget.
+    """
+    packed, used, chunks = [], 0, 0
+    for passage in passages:
+        if chunks + len(passage.chunk_ids) > max_chunks and packed:
+            continue
+        tokens = estimate_tokens(format_passage(len(packed) + 1, passage)) + 1
+        if used + tokens <= budget:
+            packed.append(passage)
+            used += tokens
+            chunks += len(passage.chunk_ids)
+        elif not packed:
+            overhead = tokens - estimate_tokens(passage.text)
+            keep = max(0, (budget - overhead) * CHARS_PER_TOKEN)
+            packed.append(Passage(passage.text[:keep], passage.metadata, passage.score, passage.chunk_ids))
+            used, chunks = budget, len(passage.chunk_ids)
+    return packed
+
+
+def assemble_context(
+    store: PersistentVectorStore,
+    retrieved: List[Tuple[Document, float]],
+    budget: int = CONTEXT_TOKEN_BUDGET,
+    max_chunks: int = CONTEXT_MAX_CHUNKS,
+    lambda_mult: float = MMR_LAMBDA,
+) -> Tuple[str, dict]:
+    """Numbered, source-labelled context from retrieved chunks, and packing stats."""
+    passages = merge_adjacent(retrieved)
+    if len(passages) > 1:
+        chunk_vectors = store.vectors_by_ids([chunk_id for p in passages for chunk_id in p.chunk_ids])
+        vectors, offset = [], 0
+        for passage in passages:
+            vectors.append(chunk_vectors[offset:offset + len(passage.chunk_ids)].mean(axis=0))
+            offset += len(passage.chunk_ids)
+        vectors = np.stack(vectors)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        passages = mmr_order(passages, vectors / norms, lambda_mult)
+
+    packed = pack(passages, budget, max_chunks)
+    context = "\n\n".join(format_passage(i + 1, p) for i, p in enumerate(packed))
+    return context, {
+        "candidates": len(retrieved),
+        "passages": len(packed),
+        "chunks": sum(len(p.chunk_ids) for p in packed),
+        "candidate_tokens": sum(estimate_tokens(doc.page_content) for doc, _ in retrieved),
+        "context_tokens": estimate_tokens(context),
+    }
@@ -1,13 +1,53 @@
-from sqlalchemy import create_engine
+import asyncio
+import contextvars
+import os
+from typing import Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./localdata.db"
+from metrics import instrument_engine, stage
+
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./localdata.db")
+ASYNC_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_WRITE_BATCH_WINDOW = float(os.getenv("DB_WRITE_BATCH_WINDOW", "0.005"))
+DB_WRITE_BATCH_MAX = int(os.getenv("DB_WRITE_BATCH_MAX", "64"))
+
+# WAL lets readers proceed while a write is in progress; synchronous=NORMAL is
+# durable across application crashes in WAL mode and avoids an fsync per commit.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": "-65536",
+    "temp_store": "MEMORY",
+    "busy_timeout": "5000",
+}
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
+event.listen(engine, "connect", set_sqlite_pragmas)
+instrument_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL, pool_size=DB_POOL_SIZE, max_overflow=DB_POOL_SIZE, pool_pre_ping=True
+)
+event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+instrument_engine(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
 print("DB is connecting ... ")
 Base = declarative_base()
 
@@ -18,3 +58,93 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+T = TypeVar("T")
+WriteOp = Callable[[AsyncSession], Awaitable[T]]
+
+
+class WriteBatcher:
+    """Groups small concurrent writes into shared transactions.
+
+    ``submit(op)`` queues ``op(session)``. Ops that arrive within
+    ``window`` seconds of each other (up to ``max_batch``) run in one
+    transaction, so SQLite takes the write lock and syncs once per batch
+    instead of once per write. If a batch fails, its ops are retried one
+    by one so only the failing op raises.
+    """
+
+    def __init__(self, window: float = DB_WRITE_BATCH_WINDOW, max_batch: int = DB_WRITE_BATCH_MAX):
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.writes = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, op: WriteOp) -> T:
+        if self._dispatcher is None or self._dispatcher.done():
+            self._queue = asyncio.Queue()
+            # The dispatcher outlives the request that starts it, so it must
+            # not inherit that request's context (e.g. its metrics trace).
+            self._dispatcher = asyncio.create_task(self._dispatch(), context=contextvars.Context())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((op, future))
+        with stage("db_write"):
+            return await future
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._run(batch)
+
+    async def _run(self, batch: List[Tuple[WriteOp, asyncio.Future]]):
+        try:
+            async with AsyncSessionLocal() as session:
+                async with session.begin():
+                    results = [await op(session) for op, _ in batch]
+        except Exception as e:
+            if len(batch) > 1:
+                for item in batch:
+                    await self._run([item])
+                return
+            _, future = batch[0]
+            if not future.done():
+                future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.writes += len(batch)
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def stop(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+
+
+write_batcher = WriteBatcher()
@@ -0,0 +1,110 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# "gemini" calls the Google embedding API; "local" runs a sentence-transformers
+# model on the CPU and needs no network once the model is downloaded.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "gemini")
+GEMINI_EMBEDDING_MODEL = "models/embedding-001"
+# Points the LangChain Gemini clients at another host, e.g. the benchmark
+# stand-in server. Only synchronous calls follow it: LangChain's async Gemini
+# client always uses gRPC against the default endpoint.
+GOOGLE_GENAI_API_ENDPOINT = os.getenv("GOOGLE_GENAI_API_ENDPOINT")
+# A Hugging Face model name or a local directory containing the model.
+LOCAL_EMBEDDING_MODEL = os.getenv("EMBEDDING_LOCAL_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_LOCAL_BATCH_SIZE", "64"))
+LOCAL_EMBEDDING_THREADS = int(os.getenv("EMBEDDING_LOCAL_THREADS", "2"))
+
+
+class LocalEmbeddings(Embeddings):
+    """Sentence-transformers embeddings computed on the CPU.
+
+    The model is loaded on first use. Inputs are cut into ``batch_size``
+    batches that run on ``threads`` worker threads; torch releases the GIL
+    during inference, and each thread gets an equal share of the cores.
+    """
+
+    def __init__(
+        self,
+        model_name: str = LOCAL_EMBEDDING_MODEL,
+        batch_size: int = LOCAL_EMBEDDING_BATCH_SIZE,
+        threads: int = LOCAL_EMBEDDING_THREADS,
+    ):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.threads = max(1, threads)
+        self._model = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._model is None:
+                try:
+                    import torch
+                    from sentence_transformers import SentenceTransformer
+                except ImportError as e:
+                    raise ImportError(
+                        "EMBEDDING_BACKEND=local requires the sentence-transformers package"
+                    ) from e
+                torch.set_num_threads(max(1, (os.cpu_count() or 1) // self.threads))
+                self._model = SentenceTransformer(self.model_name, device="cpu")
+                self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix="embed")
+        return self._model
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        return self._load().encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        self._load()
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1:
+            return self._encode(batches[0]).tolist()
+        return np.concatenate(list(self._executor.map(self._encode, batches))).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
+
+def genai_client_options() -> dict:
+    """Keyword arguments for the LangChain Gemini classes honouring GOOGLE_GENAI_API_ENDPOINT."""
+    if not GOOGLE_GENAI_API_ENDPOINT:
+        return {}
+    return {"transport": "rest", "client_options": {"api_endpoint": GOOGLE_GENAI_API_ENDPOINT}}
+
+
+def create_embeddings(backend: str = EMBEDDING_BACKEND) -> Tuple[Embeddings, str]:
+    """The configured embedding backend and the model name it reports."""
+    if backend == "gemini":
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+        return (
+            GoogleGenerativeAIEmbeddings(model=GEMINI_EMBEDDING_MODEL, **genai_client_options()),
+            GEMINI_EMBEDDING_MODEL,
+        )
+    if backend == "local":
+        return LocalEmbeddings(), LOCAL_EMBEDDING_MODEL
+    raise ValueError(f"Unknown EMBEDDING_BACKEND {backend!r}; expected 'gemini' or 'local'")
+
+
+def store_namespace(backend: str = EMBEDDING_BACKEND, model_name: str = "") -> str:
+    """Suffix for vector store directories so each model keeps its own vectors.
+
+    Gemini keeps the original directories so existing stores stay readable.
+    """
+    if backend == "gemini":
+        return ""
+    return "-" + re.sub(r"[^a-zA-Z0-9]+", "-", model_name).strip("-").lower()
@@ -0,0 +1,60 @@
+import hashlib
+import os
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from sqlite_cache import SqliteLRUCache
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an ``Embeddings`` backend with a chunk-level on-disk cache.
+
+    Entries are keyed by a SHA-256 of the model name, the embedding kind
+    (documents and queries are embedded with different task types) and the
+    text, so identical chunks are only ever sent to the backend once.
+    """
+
+    def __init__(self, underlying: Embeddings, model_name: str, cache: SqliteLRUCache):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.cache = cache
+
+    def _key(self, kind: str, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key("document", text) for text in texts]
+        cached = self.cache.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            computed = {
+                key: np.asarray(vector, dtype=np.float32).tobytes()
+                for key, vector in zip(missing, vectors)
+            }
+            self.cache.set_many(computed.items())
+            cached.update(computed)
+
+        return [np.frombuffer(cached[key], dtype=np.float32).tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key("query", text)
+        value = self.cache.get(key)
+        if value is None:
+            vector = self.underlying.embed_query(text)
+            self.cache.set(key, np.asarray(vector, dtype=np.float32).tobytes())
+            return list(vector)
+        return np.frombuffer(value, dtype=np.float32).tolist()
+
+    def stats(self) -> dict:
+        return {"model": self.model_name, **self.cache.stats()}
@@ -1,29 +1,31 @@
 from dotenv import load_dotenv
 load_dotenv()
 
+import asyncio
+import json
 import os
 import re
-from typing import List, TypedDict
+from typing import Awaitable, Callable, List, Optional, TypedDict
 
-from fastapi import FastAPI, UploadFile
+from fastapi import FastAPI
 from fastapi.responses import JSONResponse
 
-from langchain import hub
-from langchain_core.vectorstores import InMemoryVectorStore
 from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langgraph.graph import START, StateGraph
 
-from langchain_community.document_loaders import PyPDFLoader
 from langchain.prompts import ChatPromptTemplate
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
 
-from llm_config import llm  
+from llm_config import llm, embeddings, EMBEDDING_NAMESPACE
+from vector_store import PersistentVectorStore, VECTOR_STORE_DIR
+from ingest import EmbeddingBatcher, ingest_path
+from context_packing import CONTEXT_FETCH_K, assemble_context
+from tokens import prompt_tokens
+from metrics import LLMMetricsCallback, stage
 
 app = FastAPI()
 
-embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-vector_store = InMemoryVectorStore(embeddings)
+vector_store = PersistentVectorStore(embeddings, os.path.join(VECTOR_STORE_DIR, "flash_cards" + EMBEDDING_NAMESPACE))
+llm_metrics = LLMMetricsCallback("flash_cards")
 
 prompt = ChatPromptTemplate.from_template(
     """You are an expert tutor. Carefully analyze the following document and extract the 10 most important flashcards to help a student study the material. Focus on key concepts and terminology.
@@ -42,43 +44,77 @@ Each flashcard must be formatted like:
 Respond with a single valid JSON object only — without any extra text, explanation, or markdown formatting.
 Do NOT wrap the response in triple backticks (```), or use ```json or ```python.
 
-Context: {context}
+Context (numbered passages, each labelled with its source): {context}
 """
 )
 
 class State(TypedDict):
     question: str
+    document_ids: Optional[List[str]]
+    session_id: Optional[str]
     context: List[Document]
+    scores: List[float]
     answer: dict 
+    prompt_tokens: int
 
 def retrieve(state: State):
-    retrieved_docs = vector_store.similarity_search(state["question"])
-    return {"context": retrieved_docs}
+    with stage("retrieve"):
+        retrieved = vector_store.similarity_search_with_score(
+            state["question"],
+            k=CONTEXT_FETCH_K,
+            doc_ids=state.get("document_ids"),
+            session_id=state.get("session_id"),
+        )
+    return {"context": [doc for doc, _ in retrieved], "scores": [score for _, score in retrieved]}
 
 def generate(state: State):
-    docs_content = "\n\n".join(doc.page_content for doc in state["context"])
-    messages = prompt.invoke({"question": state["question"], "context": docs_content})
-    response = llm.invoke(messages)
+    with stage("context_pack"):
+        context, _ = assemble_context(vector_store, list(zip(state["context"], state["scores"])))
+    messages = prompt.invoke({"question": state["question"], "context": context})
+    response = llm.invoke(messages, config={"callbacks": [llm_metrics]})
     parsed = response.content
-    return {"answer": parsed} 
+    return {"answer": parsed, "prompt_tokens": prompt_tokens(response, messages)} 
 
 graph_builder = StateGraph(State).add_sequence([retrieve, generate])
 graph_builder.add_edge(START, "retrieve")
 graph = graph_builder.compile()
 
-async def ingest_uploaded_file(file: UploadFile):
-    file_path = f"./{file.filename}"
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
-
-    loader = PyPDFLoader(file_path)
-    pages = loader.load()
-
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    splits = text_splitter.split_documents(pages)
-
-    vector_store.add_documents(splits)
-    os.remove(file_path)
-
-    return f"Loaded {len(splits)} document chunks from {file.filename}"
-
+def clean_json_string(s: str) -> str:
+    return re.sub(r"^```(?:json|python)?\s*|\s*```$", "", s.strip())
+
+def parse_stack(raw_data) -> dict:
+    if isinstance(raw_data, str):
+        try:
+            return json.loads(clean_json_string(raw_data))
+        except json.JSONDecodeError:
+            raise ValueError("Answer is not valid JSON")
+    return raw_data
+
+async def generate_stack(
+    path: str,
+    filename: str,
+    on_stage: Optional[Callable[[str, int], Awaitable[None]]] = None,
+) -> dict:
+    async def report(stage: str, progress: int):
+        if on_stage is not None:
+            await on_stage(stage, progress)
+
+    await report("ingesting", 10)
+    batcher = EmbeddingBatcher(embeddings)
+    try:
+        document = await ingest_path(path, filename, vector_store, batcher)
+    finally:
+        await batcher.aclose()
+
+    await report("generating", 40)
+    # The chunks are only needed to build this stack, so drop them afterwards.
+    try:
+        output = await asyncio.to_thread(graph.invoke, {
+            "question": "What do I need to know for the test?",
+            "document_ids": [document["document_id"]],
+        })
+    finally:
+        await asyncio.to_thread(vector_store.delete_documents, [document["document_id"]])
+
+    await report("parsing", 80)
+    return parse_stack(output["answer"])
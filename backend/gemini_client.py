@@ -0,0 +1,191 @@
+import asyncio
+import json
+import os
+import random
+import re
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+
+import httpx
+
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "120"))
+GEMINI_CONNECT_TIMEOUT = float(os.getenv("GEMINI_CONNECT_TIMEOUT", "10"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "0.5"))
+GEMINI_BACKOFF_MAX = float(os.getenv("GEMINI_BACKOFF_MAX", "20"))
+GEMINI_MAX_RETRY_AFTER = float(os.getenv("GEMINI_MAX_RETRY_AFTER", "60"))
+GEMINI_MAX_CONNECTIONS = int(os.getenv("GEMINI_MAX_CONNECTIONS", "20"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class GeminiError(Exception):
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class GeminiClient:
+    """Async Gemini REST client sharing one keep-alive connection pool.
+
+    Transient failures (connection errors, timeouts, 5xx) are retried with
+    full-jitter exponential backoff. 429s wait for the server's Retry-After
+    (or RetryInfo) delay when it is no longer than ``max_retry_after``.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        base_url: str = GEMINI_API_BASE,
+        model: str = GEMINI_MODEL,
+        timeout: float = GEMINI_TIMEOUT,
+        connect_timeout: float = GEMINI_CONNECT_TIMEOUT,
+        max_retries: int = GEMINI_MAX_RETRIES,
+        backoff_base: float = GEMINI_BACKOFF_BASE,
+        backoff_max: float = GEMINI_BACKOFF_MAX,
+        max_retry_after: float = GEMINI_MAX_RETRY_AFTER,
+        max_connections: int = GEMINI_MAX_CONNECTIONS,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+        self._timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._limits = httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_connections
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=self._timeout, limits=self._limits)
+        return self._client
+
+    def url(self, method: str) -> str:
+        return f"{self.base_url}/models/{self.model}:{method}"
+
+    async def generate(self, prompt: str) -> str:
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+        response = await self.post("generateContent", payload)
+        return extract_text(response.json())
+
+    async def stream_generate(self, prompt: str) -> AsyncIterator[str]:
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+        # Retries only cover opening the stream; once text has been yielded
+        # a failure is surfaced to the caller instead of being replayed.
+        response = await self.post("streamGenerateContent", payload, stream=True)
+        try:
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                text = chunk_text(json.loads(line[len("data:"):]))
+                if text:
+                    yield text
+        finally:
+            await response.aclose()
+
+    async def post(self, method: str, payload: dict, stream: bool = False) -> httpx.Response:
+        attempt = 0
+        while True:
+            try:
+                params = {"key": self.api_key}
+                if stream:
+                    params["alt"] = "sse"
+                request = self.client.build_request("POST", self.url(method), params=params, json=payload)
+                response = await self.client.send(request, stream=stream)
+                if stream and response.status_code >= 400:
+                    await response.aread()
+                    await response.aclose()
+            except httpx.TransportError as e:
+                if attempt >= self.max_retries:
+                    raise GeminiError(f"Gemini request failed: {e}") from e
+                await asyncio.sleep(self.backoff(attempt))
+                attempt += 1
+                continue
+
+            if response.status_code < 400:
+                return response
+
+            self.check_retryable(response, attempt)
+            await asyncio.sleep(self.retry_delay(response, attempt))
+            attempt += 1
+
+    def check_retryable(self, response: httpx.Response, attempt: int):
+        status = response.status_code
+        if status not in RETRY_STATUSES or attempt >= self.max_retries:
+            raise GeminiError(
+                f"Gemini returned {status}: {response.text[:500]}",
+                status_code=status,
+                retry_after=retry_after(response),
+            )
+        if status == 429:
+            delay = retry_after(response)
+            if delay is not None and delay > self.max_retry_after:
+                raise GeminiError(
+                    "Gemini rate limit exceeded", status_code=429, retry_after=delay
+                )
+
+    def retry_delay(self, response: httpx.Response, attempt: int) -> float:
+        delay = retry_after(response) if response.status_code == 429 else None
+        if delay is not None:
+            return delay + random.uniform(0, self.backoff_base)
+        return self.backoff(attempt)
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def extract_text(data: dict) -> str:
+    try:
+        parts = data["candidates"][0]["content"]["parts"]
+    except (KeyError, IndexError) as e:
+        raise GeminiError(f"Unexpected Gemini response: {data}") from e
+    return "".join(part.get("text", "") for part in parts)
+
+
+def chunk_text(data: dict) -> str:
+    # Streamed chunks may carry only a finishReason or usage metadata.
+    candidates = data.get("candidates") or [{}]
+    parts = candidates[0].get("content", {}).get("parts", [])
+    return "".join(part.get("text", "") for part in parts)
+
+
+def retry_after(response: httpx.Response) -> Optional[float]:
+    header = response.headers.get("retry-after")
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            try:
+                when = parsedate_to_datetime(header)
+                return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+            except (TypeError, ValueError):
+                pass
+
+    # Gemini reports the delay as google.rpc.RetryInfo in the error body.
+    try:
+        body = response.json()
+    except ValueError:
+        return None
+    details = body.get("error", {}).get("details", []) if isinstance(body, dict) else []
+    for detail in details:
+        match = re.fullmatch(r"([\d.]+)s", str(detail.get("retryDelay", "")))
+        if match:
+            return float(match.group(1))
+    return None
+
+
+gemini = GeminiClient(api_key=os.getenv("GOOGLE_API_KEY"))
@@ -0,0 +1,196 @@
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+from typing import AsyncIterator, List, Optional, Tuple
+
+from fastapi import UploadFile
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.embeddings import Embeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from metrics import stage
+from process_pool import get_process_pool
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+INGEST_EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "100"))
+INGEST_EMBED_CONCURRENCY = int(os.getenv("INGEST_EMBED_CONCURRENCY", "4"))
+# How long the batcher waits for other files' chunks before sending a partial batch.
+INGEST_BATCH_LINGER = float(os.getenv("INGEST_BATCH_LINGER", "0.02"))
+
+
+def load_and_split(path: str, filename: str) -> Tuple[List[str], List[dict]]:
+    """Parse and split one PDF. Runs in the process pool."""
+    pages = PyPDFLoader(path).load()
+    # start_index lets context packing merge overlapping neighbours back together.
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, add_start_index=True
+    )
+    splits = splitter.split_documents(pages)
+    texts = [split.page_content for split in splits]
+    metadatas = [{**split.metadata, "source": filename} for split in splits]
+    return texts, metadatas
+
+
+class EmbeddingBatcher:
+    """Coalesces ``embed`` calls from concurrent files into shared batches.
+
+    Up to ``batch_size`` texts go out per backend call, with at most
+    ``concurrency`` calls in flight.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        batch_size: int = INGEST_EMBED_BATCH_SIZE,
+        concurrency: int = INGEST_EMBED_CONCURRENCY,
+        linger: float = INGEST_BATCH_LINGER,
+    ):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.linger = linger
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._inflight = set()
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self._queue.put_nowait((text, future))
+            futures.append(future)
+        return list(await asyncio.gather(*futures))
+
+    async def _dispatch(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = asyncio.get_running_loop().time() + self.linger
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._semaphore.acquire()
+            task = asyncio.create_task(self._send(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, batch):
+        try:
+            vectors = await asyncio.to_thread(
+                self.embeddings.embed_documents, [text for text, _ in batch]
+            )
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._semaphore.release()
+
+    async def aclose(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+
+
+async def spool(file: UploadFile) -> str:
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        while chunk := await file.read(1 << 20):
+            tmp.write(chunk)
+    return tmp.name
+
+
+async def ingest_file(
+    file: UploadFile,
+    vector_store,
+    batcher: EmbeddingBatcher,
+    session_id: Optional[str] = None,
+) -> dict:
+    path = await spool(file)
+    try:
+        return await ingest_path(path, file.filename, vector_store, batcher, session_id)
+    finally:
+        os.remove(path)
+
+
+async def ingest_path(
+    path: str,
+    filename: str,
+    vector_store,
+    batcher: EmbeddingBatcher,
+    session_id: Optional[str] = None,
+) -> dict:
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    with stage("parse_split"):
+        texts, metadatas = await loop.run_in_executor(
+            get_process_pool(), load_and_split, path, filename
+        )
+
+    document_id = uuid.uuid4().hex
+    if texts:
+        with stage("embed"):
+            vectors = await batcher.embed(texts)
+        with stage("vector_write"):
+            await asyncio.to_thread(
+                vector_store.add_vectors,
+                vectors,
+                texts,
+                metadatas=metadatas,
+                doc_id=document_id,
+                session_id=session_id,
+                source=filename,
+            )
+
+    elapsed = time.perf_counter() - started
+    return {
+        "document_id": document_id,
+        "filename": filename,
+        "chunks": len(texts),
+        "seconds": round(elapsed, 3),
+        "chunks_per_sec": round(len(texts) / elapsed, 1) if elapsed else None,
+        "message": f"Loaded {len(texts)} document chunks from {filename}",
+    }
+
+
+async def ingest_files(
+    files: List[UploadFile],
+    vector_store,
+    session_id: Optional[str] = None,
+) -> AsyncIterator[dict]:
+    """Ingest ``files`` concurrently, yielding each result as it finishes.
+
+    A file that fails yields ``{"filename", "error"}`` instead of aborting
+    the others.
+    """
+    batcher = EmbeddingBatcher(vector_store.embeddings)
+
+    async def run(file: UploadFile) -> dict:
+        try:
+            return await ingest_file(file, vector_store, batcher, session_id)
+        except Exception as e:
+            return {"filename": file.filename, "error": str(e)}
+
+    try:
+        for next_done in asyncio.as_completed([run(file) for file in files]):
+            yield await next_done
+    finally:
+        await batcher.aclose()
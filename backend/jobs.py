@@ -0,0 +1,207 @@
+import asyncio
+import contextlib
+import logging
+import os
+import uuid
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import UploadFile
+from sqlalchemy import select, update
+
+import models
+from db import AsyncSessionLocal, write_batcher
+from flash_card_agent import flash_card_agent
+from metrics import stage
+
+FLASH_CARD_WORKERS = int(os.getenv("FLASH_CARD_WORKERS", "2"))
+FLASH_CARD_QUEUE_DEPTH = int(os.getenv("FLASH_CARD_QUEUE_DEPTH", "32"))
+JOB_UPLOAD_DIR = os.getenv("JOB_UPLOAD_DIR", "./job_uploads")
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class FlashCardJobQueue:
+    """Runs flash-card generation on a bounded pool of in-process workers.
+
+    Job rows are the source of truth, and the input file is kept on disk
+    until the job ends. On startup, jobs that were queued or running when
+    the process stopped are picked up again. Status writes go through the
+    shared write batcher and never hold a session across the LLM call.
+    """
+
+    def __init__(
+        self,
+        workers: int = FLASH_CARD_WORKERS,
+        max_depth: int = FLASH_CARD_QUEUE_DEPTH,
+        upload_dir: str = JOB_UPLOAD_DIR,
+    ):
+        self.workers = workers
+        self.max_depth = max_depth
+        self.upload_dir = upload_dir
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        # Submissions that hold a slot but are still writing their file and row.
+        self._reserved = 0
+
+    @property
+    def depth(self) -> int:
+        return (self._queue.qsize() if self._queue is not None else 0) + self._reserved
+
+    async def start(self):
+        os.makedirs(self.upload_dir, exist_ok=True)
+        self._queue = asyncio.Queue()
+        for job_id in await self._recover():
+            self._queue.put_nowait(job_id)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, file: UploadFile) -> models.FlashCardJob:
+        # Check and reserve before the first await so concurrent submits
+        # cannot all pass the check.
+        if self.depth >= self.max_depth:
+            raise QueueFullError("Too many flash card jobs are waiting. Please retry shortly.")
+        self._reserved += 1
+        try:
+            job_id = uuid.uuid4().hex
+            path = os.path.join(self.upload_dir, f"{job_id}.pdf")
+            try:
+                with open(path, "wb") as f:
+                    while chunk := await file.read(1 << 20):
+                        f.write(chunk)
+                job = await self._create(job_id, file.filename, path)
+            except BaseException:
+                with contextlib.suppress(OSError):
+                    os.remove(path)
+                raise
+            self._queue.put_nowait(job_id)
+            return job
+        finally:
+            self._reserved -= 1
+
+    async def _create(self, job_id: str, filename: str, path: str) -> models.FlashCardJob:
+        now = datetime.utcnow()
+        job = models.FlashCardJob(
+            id=job_id,
+            status=QUEUED,
+            stage=QUEUED,
+            progress=0,
+            filename=filename,
+            input_path=path,
+            created_at=now,
+            updated_at=now,
+        )
+
+        async def op(db):
+            db.add(job)
+            return job
+
+        return await write_batcher.submit(op)
+
+    async def _recover(self) -> List[str]:
+        async with AsyncSessionLocal() as db:
+            jobs = (await db.execute(
+                select(models.FlashCardJob)
+                .where(models.FlashCardJob.status.in_([QUEUED, RUNNING]))
+                .order_by(models.FlashCardJob.created_at)
+            )).scalars().all()
+            for job in jobs:
+                job.status = QUEUED
+                job.stage = QUEUED
+                job.progress = 0
+            await db.commit()
+            return [job.id for job in jobs]
+
+    async def _update(self, job_id: str, **fields):
+        async def op(db):
+            await db.execute(
+                update(models.FlashCardJob)
+                .where(models.FlashCardJob.id == job_id)
+                .values(**fields, updated_at=datetime.utcnow())
+            )
+
+        await write_batcher.submit(op)
+
+    async def _save_stack(self, job_id: str, data: dict):
+        async def op(db):
+            stack = models.Stack(
+                name=data.get("name", "New Stack"),
+                description=data.get("description", ""),
+                qasets=[
+                    models.QAset(question=qa["question"], answer=qa["answer"])
+                    for qa in data["qasets"]
+                ],
+            )
+            db.add(stack)
+            await db.flush()
+            await db.execute(
+                update(models.FlashCardJob)
+                .where(models.FlashCardJob.id == job_id)
+                .values(
+                    status=SUCCEEDED,
+                    stage=SUCCEEDED,
+                    progress=100,
+                    stack_id=stack.id,
+                    updated_at=datetime.utcnow(),
+                )
+            )
+
+        await write_batcher.submit(op)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Keep the worker alive whatever went wrong with this job.
+                logger.exception("Flash card job %s failed outside generation", job_id)
+                try:
+                    await self._update(job_id, status=FAILED, stage=FAILED, error=str(e))
+                except Exception:
+                    logger.exception("Could not mark flash card job %s as failed", job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        async with AsyncSessionLocal() as db:
+            job = await db.get(models.FlashCardJob, job_id)
+            if job is None:
+                return
+            path, filename = job.input_path, job.filename
+
+        async def on_stage(stage: str, progress: int):
+            await self._update(job_id, status=RUNNING, stage=stage, progress=progress)
+
+        try:
+            with stage("flash_card_job"):
+                data = await flash_card_agent.generate_stack(path, filename, on_stage=on_stage)
+            await on_stage("saving", 90)
+            await self._save_stack(job_id, data)
+        except asyncio.CancelledError:
+            # Shutting down: leave the job and its file for recovery on restart.
+            raise
+        except Exception as e:
+            await self._update(job_id, status=FAILED, stage=FAILED, error=str(e))
+
+        with contextlib.suppress(OSError):
+            os.remove(path)
+
+
+flash_card_jobs = FlashCardJobQueue()
@@ -1,14 +1,29 @@
 import os
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.agents import initialize_agent, AgentType
-from langchain.memory import ConversationBufferMemory
 from dotenv import load_dotenv
 load_dotenv()
+from embedding_backends import EMBEDDING_BACKEND, create_embeddings, genai_client_options, store_namespace
+from embedding_cache import CachedEmbeddings, EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES
+from sqlite_cache import SqliteLRUCache
+from session_memory import SessionMemoryStore, llm_summarizer
 
 llm = ChatGoogleGenerativeAI(
     model="gemini-2.0-flash",
     temperature=0,
-    google_api_key=os.getenv("GOOGLE_API_KEY")
+    google_api_key=os.getenv("GOOGLE_API_KEY"),
+    **genai_client_options(),
 )
 
-memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+session_memory = SessionMemoryStore(summarize=llm_summarizer(llm))
+
+embedding_backend, EMBEDDING_MODEL = create_embeddings(EMBEDDING_BACKEND)
+# Appended to vector store directory names; vectors from different models
+# cannot share a store.
+EMBEDDING_NAMESPACE = store_namespace(EMBEDDING_BACKEND, EMBEDDING_MODEL)
+
+embeddings = CachedEmbeddings(
+    embedding_backend,
+    model_name=EMBEDDING_MODEL,
+    cache=SqliteLRUCache(EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES),
+)
@@ -1,27 +1,62 @@
+import hashlib
 import os
-import fitz
+import tempfile
+import uuid
 from dotenv import load_dotenv
 load_dotenv()
-from fastapi import FastAPI, UploadFile, File, Form, Body
-from typing import List
+from fastapi import FastAPI, UploadFile, File, Form, Body, BackgroundTasks
+from typing import List, Optional
 from fastapi.middleware.cors import CORSMiddleware
-import requests
+from fastapi.concurrency import run_in_threadpool
 from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
 from calendar_agent.calendar_agent import agent
-from upload_agent.upload_agent import ingest_uploaded_file, graph
-from flash_card_agent.flash_card_agent import ingest_uploaded_file, graph
+from calendar_agent.intent_router import fast_answer, resolve_dates, describe_dates
+from upload_agent.upload_agent import answer_cache, answer_question, astream_answer, vector_store as upload_vector_store
 from fastapi.responses import JSONResponse
 from fastapi import FastAPI, Request, Depends, Query, HTTPException
-from sqlalchemy.orm import Session,  relationship
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, relationship, selectinload
 import models, schemas
-from db import get_db, engine
-import json
-import re
+from db import get_db, get_async_db, engine, write_batcher
+import time
 from queryClasses import AskRequest
+from llm_config import embeddings, session_memory
+from pdf_extract import extract_text_from_pdf, PDF_MAX_CHARS
+from process_pool import shutdown_process_pool
+from gemini_client import gemini, GeminiError
+from streaming import sse_response
+from map_reduce import map_reduce, map_reduce_stream, should_map_reduce
+from chat_cache import chat_cache, chat_cache_key, record_stream, replay
+from ingest import ingest_files
+from jobs import flash_card_jobs, QueueFullError, SUCCEEDED
+from search import create_search_index, search_flash_cards
+from metrics import LLMMetricsCallback, MetricsMiddleware, metrics_response, register_cache, register_queue, stage
 
 app = FastAPI()
+app.add_middleware(MetricsMiddleware)
+
+register_cache("embeddings", embeddings.stats)
+register_cache("chat", chat_cache.stats)
+register_cache("answers", answer_cache.stats)
+register_queue("flash_card_jobs", lambda: flash_card_jobs.depth)
+register_queue("db_writes", lambda: write_batcher.depth)
+calendar_metrics = LLMMetricsCallback("calendar")
 
 models.Base.metadata.create_all(bind=engine)
+create_search_index(engine)
+
+@app.on_event("startup")
+async def startup():
+    await flash_card_jobs.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await flash_card_jobs.stop()
+    await write_batcher.stop()
+    shutdown_process_pool()
+    await gemini.aclose()
 
 app.add_middleware(
     CORSMiddleware,
@@ -30,24 +65,43 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
-GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
-
-def extract_text_from_pdf(file_bytes: bytes) -> str:
-    with fitz.open(stream=file_bytes, filetype="pdf") as doc:
-        text = ""
-        for page in doc:
-            text += page.get_text()
-    return text
+async def spool_upload(file: UploadFile):
+    # Copy the upload to disk in chunks, hashing as we go, instead of holding
+    # it in memory; PDF page ranges are then handed to the process pool by path.
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(delete=False) as tmp:
+        while chunk := await file.read(1 << 20):
+            digest.update(chunk)
+            tmp.write(chunk)
+    return tmp.name, digest.hexdigest()
+
+async def read_upload_text(path: str, content_type: str) -> str:
+    if content_type == "application/pdf":
+        with stage("pdf_extract"):
+            return await run_in_threadpool(extract_text_from_pdf, path)
+    with open(path, "rb") as f:
+        return f.read(PDF_MAX_CHARS * 4).decode("utf-8", errors="ignore")[:PDF_MAX_CHARS]
 
 @app.post("/chat")
-async def chat_with_gemini(file: UploadFile = File(...), action: str = Form(...)):
-    file_bytes = await file.read()
+async def chat_with_gemini(
+    file: UploadFile = File(...),
+    action: str = Form(...),
+    stream: bool = Form(False),
+    no_cache: bool = Form(False),
+):
+    started = time.perf_counter()
+    path, file_hash = await spool_upload(file)
+    try:
+        cache_key = chat_cache_key(file_hash, action, gemini.model)
+        cached = None if no_cache else await run_in_threadpool(chat_cache.get, cache_key)
+        if cached is not None:
+            if stream:
+                return sse_response(replay(cached), started)
+            return {"response": cached, "cached": True}
 
-    if file.content_type == "application/pdf":
-        text_from_file = extract_text_from_pdf(file_bytes)
-    else:
-        text_from_file = file_bytes.decode("utf-8", errors="ignore")
+        text_from_file = await read_upload_text(path, file.content_type)
+    finally:
+        os.remove(path)
 
     actionText = "" 
 
@@ -61,157 +115,262 @@ async def chat_with_gemini(file: UploadFile = File(...), action: str = Form(...)
         actionText = "Write 10 quiz questions based on the text provided. Write answers underneath the question block. The questions and the answers must be numbered like QUESTIONS Q1:  and ANSWERS A1:  "
 
     full_prompt = f"{text_from_file}\n\nUser Question: {actionText}"
-    
-    payload = {
-        "contents": [
-            {
-                "parts": [
-                    {"text": full_prompt}
-                ]
-            }
-        ]
-    }
+
+    use_map_reduce = should_map_reduce(text_from_file)
+
+    if stream:
+        if use_map_reduce:
+            chunks = map_reduce_stream(text_from_file, action, actionText)
+        else:
+            chunks = gemini.stream_generate(full_prompt)
+        return sse_response(record_stream(chunks, chat_cache, cache_key), started)
 
     try:
-        response = requests.post(
-            f"{GEMINI_API_URL}?key={GEMINI_API_KEY}",
-            headers={"Content-Type": "application/json"},
-            json=payload
-        )
-        if response.status_code == 429: 
-            return {"response": "Too many requests. Please retry in 60 minutes."}
-        response.raise_for_status()
-        
-        data = response.json()
-        output = data["candidates"][0]["content"]["parts"][0]["text"]
+        with stage("llm"):
+            if use_map_reduce:
+                output = await map_reduce(text_from_file, action, actionText)
+            else:
+                output = await gemini.generate(full_prompt)
+        await run_in_threadpool(chat_cache.set, cache_key, output)
         return {"response": output}
+    except GeminiError as e:
+        if e.status_code == 429:
+            headers = {"Retry-After": str(int(e.retry_after))} if e.retry_after else None
+            return JSONResponse(status_code=429, content={"error": str(e), "retry_after": e.retry_after}, headers=headers)
+        return {"error": str(e)}
     except Exception as e:
         return {"error": str(e)}
 
+@app.get("/cache/stats")
+def cache_stats():
+    return {"embeddings": embeddings.stats(), "chat": chat_cache.stats(), "answers": answer_cache.stats()}
+
+@app.get("/metrics")
+def metrics():
+    return metrics_response()
+
 @app.post("/calendar")
-async def calender_agent(question: str = Body(..., embed=True)): 
+async def calender_agent(
+    background_tasks: BackgroundTasks,
+    question: str = Body(..., embed=True),
+    session_id: Optional[str] = Body(None, embed=True),
+): 
 
     timezone="America/New_York"
-    current_date=datetime.now()
+    current_date=datetime.now(ZoneInfo(timezone))
+    session_id = session_id or uuid.uuid4().hex
+
+    def remember(answer: str):
+        if session_memory.append(session_id, question, answer):
+            background_tasks.add_task(session_memory.compact, session_id)
+
+    with stage("calendar_fast_path"):
+        answer = await run_in_threadpool(fast_answer, question, timezone, current_date)
+    if answer is not None:
+        remember(answer)
+        return {"response": {"input": question, "output": answer}, "fast_path": True, "session_id": session_id}
 
     prompt = f"Question: {question}. Additional information: timezone: {timezone}, the current date: {current_date}."
+    resolved = resolve_dates(question, current_date)
+    if resolved:
+        prompt += f" Resolved dates: {describe_dates(resolved)}."
+    history = session_memory.history(session_id)
+    if history:
+        prompt = f"Conversation so far:\n{history}\n\n{prompt}"
     
     try:
-        result = agent.invoke(prompt)
-        return {"response": result}
+        result = await run_in_threadpool(agent.invoke, prompt, {"callbacks": [calendar_metrics]})
+        remember(result.get("output", ""))
+        return {"response": result, "fast_path": False, "session_id": session_id}
     except Exception as e:
         print("Error:", e)
-        return {"error": str(e)}
-
+        return {"error": str(e), "fast_path": False, "session_id": session_id}
 
 @app.post("/upload")
-async def upload_agent(files: List[UploadFile] = File(...)):
-    results = []
-    for file in files:
-        message = await ingest_uploaded_file(file)
-        results.append(message)
-    return {"status": "success", "message": results}
-
-
-@app.post("/upload/ask")
-async def ask_upload_question(data: AskRequest):
-    response = graph.invoke({"question": data.question})
-    return {"answer": response["answer"]}
-
+async def upload_agent(
+    files: List[UploadFile] = File(...),
+    session_id: Optional[str] = Form(None),
+    stream: bool = Form(False),
+):
+    started = time.perf_counter()
+    session_id = session_id or uuid.uuid4().hex
+    results = ingest_files(files, upload_vector_store, session_id=session_id)
+    if stream:
+        return sse_response(results, started, event="document")
+
+    documents = [result async for result in results]
+    return {
+        "status": "success",
+        "session_id": session_id,
+        "document_ids": [doc["document_id"] for doc in documents if "document_id" in doc],
+        "documents": documents,
+        "message": [doc.get("message", doc.get("error")) for doc in documents],
+    }
 
-@app.post("/create-flash-cards")
-async def upload(file: UploadFile, db: Session = Depends(get_db)):
-    await ingest_uploaded_file(file)
-    
-    output = graph.invoke({
-        "question": "What do I need to know for the test?"
-    })
 
-    def clean_json_string(s: str) -> str:
-        return re.sub(r"^```(?:json|python)?\s*|\s*```$", "", s.strip())
+@app.get("/upload/documents")
+def list_uploaded_documents(session_id: Optional[str] = None):
+    return [
+        {
+            "document_id": doc.doc_id,
+            "session_id": doc.session_id,
+            "filename": doc.source,
+            "chunks": doc.chunks,
+            "created_at": doc.created_at,
+        }
+        for doc in upload_vector_store.documents(session_id=session_id)
+    ]
 
 
-    raw_data = output["answer"]
-    cleaned = clean_json_string(raw_data)
+@app.delete("/upload/{document_id}")
+def delete_uploaded_document(document_id: str):
+    if not upload_vector_store.delete_documents([document_id]):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"detail": f"Document {document_id} deleted successfully"}
 
-    if isinstance(raw_data, str):
-        try:
-            data = json.loads(cleaned)
-        except json.JSONDecodeError:
-            raise HTTPException(status_code=400, detail="Answer is not valid JSON")
-    else:
-        data = raw_data
 
-    qa_objects = [
-        models.QAset(question=qa["question"], answer=qa["answer"])
-        for qa in data["qasets"]
-    ]
+@app.post("/upload/ask")
+async def ask_upload_question(data: AskRequest):
+    if data.stream:
+        return sse_response(
+            astream_answer(data.question, data.document_ids, data.session_id), time.perf_counter()
+        )
 
-    new_stack = models.Stack(
-        name=data.get("name", "New Stack"),
-        description=data.get("description", ""),
-        qasets=qa_objects
-    )
+    return await run_in_threadpool(answer_question, data.question, data.document_ids, data.session_id)
 
-    db.add(new_stack)
-    db.commit()
-    db.refresh(new_stack)
 
-    return JSONResponse(content=output["answer"])
+@app.post("/create-flash-cards", status_code=202, response_model=schemas.FlashCardJobSchema)
+async def upload(file: UploadFile):
+    try:
+        return await flash_card_jobs.submit(file)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+
+@app.get("/flash-card-jobs/{job_id}", response_model=schemas.FlashCardJobSchema)
+async def get_flash_card_job(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    job = await db.get(models.FlashCardJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/flash-card-jobs/{job_id}/result", response_model=schemas.StackSchema)
+async def get_flash_card_job_result(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    job = await db.get(models.FlashCardJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status != SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    return await get_stack(job.stack_id, db)
 
 @app.get("/get-flash-cards", response_model=List[schemas.StackSchema])
-def get_flash_cards(db: Session = Depends(get_db)):
-    return db.query(models.Stack).all()
+async def get_flash_cards(
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    after_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    # selectinload fetches every page's cards in one extra query instead of
+    # one lazy load per stack during serialization.
+    query = select(models.Stack).options(selectinload(models.Stack.qasets)).order_by(models.Stack.id)
+    if after_id is not None:
+        query = query.where(models.Stack.id > after_id)
+    if limit is not None:
+        query = query.limit(limit)
+    return (await db.execute(query)).scalars().all()
+
+@app.get("/flash-cards", response_model=schemas.StackPageSchema)
+async def list_flash_card_stacks(
+    limit: int = Query(50, ge=1, le=500),
+    after_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    card_counts = (
+        select(models.QAset.stack_id, func.count(models.QAset.id).label("card_count"))
+        .group_by(models.QAset.stack_id)
+        .subquery()
+    )
+    query = (
+        select(
+            models.Stack.id,
+            models.Stack.name,
+            models.Stack.description,
+            func.coalesce(card_counts.c.card_count, 0).label("card_count"),
+        )
+        .outerjoin(card_counts, card_counts.c.stack_id == models.Stack.id)
+        .order_by(models.Stack.id)
+    )
+    if after_id is not None:
+        query = query.where(models.Stack.id > after_id)
+
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    items = [schemas.StackSummarySchema(**row._mapping) for row in rows[:limit]]
+    next_after_id = items[-1].id if len(rows) > limit else None
+    return {"items": items, "next_after_id": next_after_id}
+
+@app.get("/search-flash-cards", response_model=schemas.SearchResultsSchema)
+async def search_flash_card_library(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+):
+    return await search_flash_cards(db, q, limit)
 
-@app.patch("/edit-flash-cards", response_model=List[schemas.StackSchema])
-def edit_flash_cards(
+@app.patch("/edit-flash-cards", response_model=schemas.StackSchema)
+async def edit_flash_cards(
     updated_stack: schemas.StackSchema,  
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    
-    stack = db.query(models.Stack).filter(models.Stack.id == updated_stack.id).first()
-    if not stack:
+    async def op(session: AsyncSession):
+        stack = await session.get(models.Stack, updated_stack.id)
+        if not stack:
+            return None
+
+        stack.name = updated_stack.name
+        stack.description = updated_stack.description
+
+        existing_ids = set((await session.execute(
+            select(models.QAset.id).where(models.QAset.stack_id == stack.id)
+        )).scalars())
+        updates = []
+        inserts = []
+        for qa_data in updated_stack.qasets:
+            if qa_data.id in existing_ids:
+                updates.append({"id": qa_data.id, "question": qa_data.question, "answer": qa_data.answer})
+            else:
+                inserts.append({"question": qa_data.question, "answer": qa_data.answer, "stack_id": stack.id})
+
+        if updates:
+            await session.execute(update(models.QAset), updates)
+        if inserts:
+            await session.execute(insert(models.QAset), inserts)
+        return stack.id
+
+    stack_id = await write_batcher.submit(op)
+    if stack_id is None:
         raise HTTPException(status_code=404, detail="Stack not found")
-
-    stack.name = updated_stack.name
-    stack.description = updated_stack.description
-
-    for qa_data in updated_stack.qasets:
-        qa_entry = db.query(models.QAset).filter(
-            models.QAset.id == qa_data.id,
-            models.QAset.stack_id == stack.id
-        ).first()
-
-        if qa_entry:
-            qa_entry.question = qa_data.question
-            qa_entry.answer = qa_data.answer
-        else:
-            new_qa = models.QAset(
-                question=qa_data.question,
-                answer=qa_data.answer,
-                stack_id=stack.id
-            )
-            db.add(new_qa)
-
-    db.flush()
-    db.commit()
-
-    return db.query(models.Stack).all()
+    return await get_stack(stack_id, db)
 
 
 @app.get("/get-flash-cards/{id}", response_model=schemas.StackSchema)
-def get_stack(id: int, db: Session = Depends(get_db)):
-    stack = db.query(models.Stack).filter(models.Stack.id == id).first()
+async def get_stack(id: int, db: AsyncSession = Depends(get_async_db)):
+    stack = await db.scalar(
+        select(models.Stack)
+        .options(selectinload(models.Stack.qasets))
+        .where(models.Stack.id == id)
+    )
     if not stack:
         raise HTTPException(status_code=404, detail="Stack not found")
     return stack
 
 
 @app.delete("/delete-flash-cards/{id}")
-def get_stack(id: int, db: Session = Depends(get_db)):
-    stack = db.query(models.Stack).filter(models.Stack.id == id).first()
-    if not stack:
+async def delete_stack(id: int):
+    async def op(session: AsyncSession):
+        stack = await session.get(models.Stack, id, options=[selectinload(models.Stack.qasets)])
+        if not stack:
+            return False
+        await session.delete(stack)
+        return True
+
+    if not await write_batcher.submit(op):
         raise HTTPException(status_code=404, detail="Stack not found")
-    db.delete(stack)
-    db.commit()
-    return JSONResponse(content={"detail": f"Stack {id} deleted successfully"})
\ No newline at end of file
+    return JSONResponse(content={"detail": f"Stack {id} deleted successfully"})
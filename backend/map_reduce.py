@@ -0,0 +1,92 @@
+import asyncio
+import os
+from typing import AsyncIterator, List
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from gemini_client import GeminiClient, gemini
+from tokens import estimate_tokens
+
+MAP_REDUCE_THRESHOLD_TOKENS = int(os.getenv("MAP_REDUCE_THRESHOLD_TOKENS", "100000"))
+MAP_REDUCE_CHUNK_TOKENS = int(os.getenv("MAP_REDUCE_CHUNK_TOKENS", "16000"))
+MAP_REDUCE_CONCURRENCY = int(os.getenv("MAP_REDUCE_CONCURRENCY", "4"))
+MAX_COLLAPSE_ROUNDS = 3
+
+SUMMARY_MAP_PROMPT = "Summarize this section of a larger document. Keep every major point, key fact and term."
+
+MAP_PROMPTS = {
+    "summarize-paragraph": SUMMARY_MAP_PROMPT,
+    "summarize-bullets": SUMMARY_MAP_PROMPT,
+    "list-concepts": "List the major terms in this section of a larger document and give the definition of each term from the text.",
+}
+QUIZ_MAP_PROMPT = "List, as short bullets, the most important facts and concepts in this section of a larger document that a quiz could test."
+
+REDUCE_PREFIX = "The following are notes on consecutive sections of one document, in order. Treat them as the text of the document. Merge duplicated points."
+
+splitter = RecursiveCharacterTextSplitter(
+    chunk_size=MAP_REDUCE_CHUNK_TOKENS,
+    chunk_overlap=0,
+    length_function=estimate_tokens,
+)
+
+
+def should_map_reduce(text: str) -> bool:
+    return estimate_tokens(text) > MAP_REDUCE_THRESHOLD_TOKENS
+
+
+async def map_chunks(
+    chunks: List[str], instruction: str, client: GeminiClient, concurrency: int
+) -> List[str]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(chunk: str) -> str:
+        async with semaphore:
+            return await client.generate(f"{chunk}\n\nUser Question: {instruction}")
+
+    return await asyncio.gather(*(run(chunk) for chunk in chunks))
+
+
+async def collapse(
+    text: str, action: str, client: GeminiClient, concurrency: int
+) -> str:
+    """Run the map step, repeating it over the partial results until they
+    fit in a single reduce prompt."""
+    instruction = MAP_PROMPTS.get(action, QUIZ_MAP_PROMPT)
+    partials = await map_chunks(splitter.split_text(text), instruction, client, concurrency)
+    combined = "\n\n".join(partials)
+
+    for _ in range(MAX_COLLAPSE_ROUNDS):
+        if not should_map_reduce(combined):
+            break
+        partials = await map_chunks(
+            splitter.split_text(combined), SUMMARY_MAP_PROMPT, client, concurrency
+        )
+        combined = "\n\n".join(partials)
+    return combined
+
+
+def reduce_prompt(notes: str, action_text: str) -> str:
+    return f"{REDUCE_PREFIX}\n\n{notes}\n\nUser Question: {action_text}"
+
+
+async def map_reduce(
+    text: str,
+    action: str,
+    action_text: str,
+    client: GeminiClient = gemini,
+    concurrency: int = MAP_REDUCE_CONCURRENCY,
+) -> str:
+    notes = await collapse(text, action, client, concurrency)
+    return await client.generate(reduce_prompt(notes, action_text))
+
+
+async def map_reduce_stream(
+    text: str,
+    action: str,
+    action_text: str,
+    client: GeminiClient = gemini,
+    concurrency: int = MAP_REDUCE_CONCURRENCY,
+) -> AsyncIterator[str]:
+    notes = await collapse(text, action, client, concurrency)
+    async for chunk in client.stream_generate(reduce_prompt(notes, action_text)):
+        yield chunk
@@ -0,0 +1,255 @@
+import contextvars
+import functools
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from fastapi import Response
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from starlette.datastructures import Headers, MutableHeaders
+
+# Requests carrying this header (any value but "0") get a Server-Timing
+# response header with their own stage timings; streamed responses report
+# them in the final "done" event instead, since headers go out first.
+TRACE_HEADER = os.getenv("METRICS_TRACE_HEADER", "X-Trace")
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+REQUEST_SECONDS = Histogram(
+    "backend_request_seconds", "HTTP request latency.", ["method", "route", "status"], buckets=SECONDS_BUCKETS
+)
+STAGE_SECONDS = Histogram(
+    "backend_stage_seconds", "Time spent in one stage of a request or job.", ["stage"], buckets=SECONDS_BUCKETS
+)
+TOOL_SECONDS = Histogram(
+    "backend_tool_seconds", "Calendar tool latency.", ["tool", "outcome"], buckets=SECONDS_BUCKETS
+)
+LLM_TOKENS = Histogram(
+    "backend_llm_tokens", "Tokens per LLM call, as reported by the model.", ["agent", "kind"],
+    buckets=(64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536),
+)
+AGENT_STEPS = Histogram(
+    "backend_agent_steps", "Tool calls per agent run.", ["agent"], buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10, 15)
+)
+
+class Trace(List[Tuple[str, float]]):
+    """Stage timings of one traced request. Closed once the request ends, so a
+    task that inherited the request's context cannot keep adding to it."""
+
+    closed = False
+
+
+_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+
+
+def _add_to_trace(name: str, seconds: float):
+    trace = _trace.get()
+    if trace is not None and not trace.closed:
+        trace.append((name, seconds))
+
+
+def record_stage(name: str, seconds: float):
+    STAGE_SECONDS.labels(name).observe(seconds)
+    _add_to_trace(name, seconds)
+
+
+@contextmanager
+def stage(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+def trace_summary() -> Optional[Dict[str, float]]:
+    """Milliseconds per stage for the current traced request, or None if it is not traced."""
+    trace = _trace.get()
+    if trace is None:
+        return None
+    summary: Dict[str, float] = {}
+    for name, seconds in list(trace):
+        summary[name] = summary.get(name, 0.0) + seconds * 1000
+    return {name: round(ms, 1) for name, ms in summary.items()}
+
+
+def timed_tool(func: Callable) -> Callable:
+    """Record the latency of a calendar tool, whether the agent or the fast path calls it."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started, outcome = time.perf_counter(), "error"
+        try:
+            result = func(*args, **kwargs)
+            outcome = "ok"
+            return result
+        finally:
+            seconds = time.perf_counter() - started
+            TOOL_SECONDS.labels(func.__name__, outcome).observe(seconds)
+            _add_to_trace(f"tool.{func.__name__}", seconds)
+    return wrapper
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """Records LLM latency and token counts, and tool calls per agent run.
+
+    Pass it in the ``callbacks`` config of an LLM or agent call; one
+    instance per agent, which is used as the ``agent`` label.
+    """
+
+    def __init__(self, agent: str):
+        self.agent = agent
+        self._llm_started: Dict[UUID, float] = {}
+        self._steps: Dict[UUID, int] = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs):
+        self._llm_started[run_id] = time.perf_counter()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs):
+        self._llm_started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs):
+        started = self._llm_started.pop(run_id, None)
+        if started is not None:
+            record_stage("llm", time.perf_counter() - started)
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    LLM_TOKENS.labels(self.agent, "prompt").observe(usage.get("input_tokens", 0))
+                    LLM_TOKENS.labels(self.agent, "completion").observe(usage.get("output_tokens", 0))
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs):
+        started = self._llm_started.pop(run_id, None)
+        if started is not None:
+            record_stage("llm", time.perf_counter() - started)
+
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs):
+        if parent_run_id is None:
+            self._steps[run_id] = 0
+
+    def on_agent_action(self, action, *, run_id: UUID, **kwargs):
+        if run_id in self._steps:
+            self._steps[run_id] += 1
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs):
+        steps = self._steps.pop(run_id, None)
+        if steps is not None:
+            AGENT_STEPS.labels(self.agent).observe(steps)
+
+    def on_chain_error(self, error, *, run_id: UUID, **kwargs):
+        self.on_chain_end(None, run_id=run_id)
+
+
+class StatsCollector:
+    """Reads cache hit ratios and queue depths from their owners at scrape time."""
+
+    def __init__(self):
+        self.caches: Dict[str, Callable[[], dict]] = {}
+        self.queues: Dict[str, Callable[[], int]] = {}
+
+    def collect(self):
+        hits = CounterMetricFamily("backend_cache_hits", "Cache hits since startup.", labels=["cache"])
+        misses = CounterMetricFamily("backend_cache_misses", "Cache misses since startup.", labels=["cache"])
+        ratio = GaugeMetricFamily("backend_cache_hit_ratio", "Cache hit ratio since startup.", labels=["cache"])
+        for name, stats in self.caches.items():
+            values = stats()
+            hits.add_metric([name], values["hits"])
+            misses.add_metric([name], values["misses"])
+            ratio.add_metric([name], values["hit_ratio"])
+        depth = GaugeMetricFamily("backend_queue_depth", "Items waiting in a queue.", labels=["queue"])
+        for name, size in self.queues.items():
+            depth.add_metric([name], size())
+        return [hits, misses, ratio, depth]
+
+
+collector = StatsCollector()
+REGISTRY.register(collector)
+
+
+def register_cache(name: str, stats: Callable[[], dict]):
+    """``stats`` must return ``hits``, ``misses`` and ``hit_ratio``."""
+    collector.caches[name] = stats
+
+
+def register_queue(name: str, depth: Callable[[], int]):
+    collector.queues[name] = depth
+
+
+def instrument_engine(engine):
+    """Time every SQL statement run on a (sync) engine as the ``sqlite`` stage."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        record_stage("sqlite", time.perf_counter() - conn.info["query_started"].pop())
+
+    @event.listens_for(engine, "handle_error")
+    def failed(exception_context):
+        started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+        if started:
+            started.pop()
+
+
+def server_timing(summary: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={ms}" for name, ms in summary.items())
+
+
+class MetricsMiddleware:
+    """Times every request by route template and handles the trace header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traced = Headers(scope=scope).get(TRACE_HEADER, "0") not in ("", "0")
+        trace = Trace() if traced else None
+        token = _trace.set(trace)
+        started = time.perf_counter()
+        status, observed = 500, False
+
+        def observe():
+            nonlocal observed
+            if not observed:
+                observed = True
+                route = scope.get("route")
+                REQUEST_SECONDS.labels(
+                    scope["method"], getattr(route, "path", "unmatched"), str(status)
+                ).observe(time.perf_counter() - started)
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if traced:
+                    summary = trace_summary()
+                    summary["total"] = round((time.perf_counter() - started) * 1000, 1)
+                    MutableHeaders(scope=message).append("Server-Timing", server_timing(summary))
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                # Before the last byte goes out, so a client that scrapes
+                # right after its response already sees this request.
+                observe()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            observe()
+            if trace is not None:
+                trace.closed = True
+            _trace.reset(token)
+
+
+def metrics_response() -> Response:
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
 from db import Base
 from sqlalchemy.orm import Session, relationship
 
@@ -7,14 +7,28 @@ class Stack(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    description = Column(String, index=True)
+    description = Column(String)
     qasets = relationship("QAset", back_populates="stack", cascade="all, delete-orphan")
 
 class QAset(Base):
     __tablename__ = "qasets"
 
     id = Column(Integer, primary_key=True, index=True)
-    question = Column(String, index=True)
-    answer = Column(String, index=True)
+    question = Column(String)
+    answer = Column(String)
     stack_id = Column(Integer, ForeignKey("stacks.id"))
     stack = relationship("Stack", back_populates="qasets")
+
+class FlashCardJob(Base):
+    __tablename__ = "flash_card_jobs"
+
+    id = Column(String, primary_key=True, index=True)
+    status = Column(String, index=True)
+    stage = Column(String)
+    progress = Column(Integer, default=0)
+    filename = Column(String)
+    input_path = Column(String)
+    error = Column(String, nullable=True)
+    stack_id = Column(Integer, ForeignKey("stacks.id"), nullable=True)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
@@ -0,0 +1,75 @@
+import os
+from typing import Iterator, List, Union
+
+import fitz
+
+from process_pool import PROCESS_POOL_WORKERS, get_process_pool
+
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "1000"))
+PDF_MAX_CHARS = int(os.getenv("PDF_MAX_CHARS", "4000000"))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "32"))
+
+
+def count_pages(source: Union[str, bytes]) -> int:
+    with _open(source) as doc:
+        return doc.page_count
+
+
+def iter_pdf_pages(source: Union[str, bytes], start: int = 0, stop: int = None) -> Iterator[str]:
+    with _open(source) as doc:
+        stop = doc.page_count if stop is None else min(stop, doc.page_count)
+        for number in range(start, stop):
+            yield doc.load_page(number).get_text()
+
+
+def extract_page_range(path: str, start: int, stop: int) -> List[str]:
+    return list(iter_pdf_pages(path, start, stop))
+
+
+def iter_pdf_text(
+    source: Union[str, bytes],
+    max_pages: int = PDF_MAX_PAGES,
+    max_chars: int = PDF_MAX_CHARS,
+    workers: int = PROCESS_POOL_WORKERS,
+) -> Iterator[str]:
+    """Yield page texts in order, stopping at ``max_pages`` or ``max_chars``.
+
+    Documents with at least ``PDF_PARALLEL_MIN_PAGES`` pages are split into
+    page ranges that are extracted in the shared process pool; smaller ones
+    and in-memory documents are read page by page in the calling thread.
+    """
+    total = min(count_pages(source), max_pages)
+    chars = 0
+
+    if isinstance(source, str) and workers > 1 and total >= PDF_PARALLEL_MIN_PAGES:
+        pool = get_process_pool()
+        futures = [
+            pool.submit(extract_page_range, source, start, min(start + PDF_PAGES_PER_TASK, total))
+            for start in range(0, total, PDF_PAGES_PER_TASK)
+        ]
+        pages = (page for future in futures for page in future.result())
+    else:
+        futures = []
+        pages = iter_pdf_pages(source, 0, total)
+
+    try:
+        for page in pages:
+            if chars + len(page) >= max_chars:
+                yield page[:max_chars - chars]
+                return
+            chars += len(page)
+            yield page
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def extract_text_from_pdf(source: Union[str, bytes], **kwargs) -> str:
+    return "".join(iter_pdf_text(source, **kwargs))
+
+
+def _open(source: Union[str, bytes]):
+    if isinstance(source, str):
+        return fitz.open(source)
+    return fitz.open(stream=source, filetype="pdf")
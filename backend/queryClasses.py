@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 class Query(BaseModel):
     question: str
@@ -11,4 +11,7 @@ class CalendarEventQuery(BaseModel):
     timezone: Optional[str] = "America/New_York"
 
 class AskRequest(BaseModel):
-    question: str
\ No newline at end of file
+    question: str
+    document_ids: Optional[List[str]] = None
+    session_id: Optional[str] = None
+    stream: Optional[bool] = False
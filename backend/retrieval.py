@@ -0,0 +1,94 @@
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from vector_store import PersistentVectorStore
+
+# "auto" answers keyword-like questions from the BM25 index alone, which
+# skips the question-embedding call, and fuses both rankings otherwise.
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "auto")
+# How many candidates each ranking contributes before fusion.
+HYBRID_FETCH_K = int(os.getenv("HYBRID_FETCH_K", "20"))
+# Standard reciprocal-rank-fusion damping constant.
+RRF_K = 60
+
+MODES = ("auto", "dense", "lexical", "hybrid")
+QUESTION_WORDS = {
+    "what", "why", "how", "when", "where", "which", "who", "whom", "whose",
+    "explain", "describe", "compare", "summarize", "summarise", "list", "define",
+    "does", "do", "is", "are", "can", "should", "could", "would",
+}
+KEYWORD_QUERY_MAX_WORDS = 4
+
+
+def is_keyword_query(query: str) -> bool:
+    words = re.findall(r"\w+", query.lower())
+    if not words or len(words) > KEYWORD_QUERY_MAX_WORDS or "?" in query:
+        return False
+    return words[0] not in QUESTION_WORDS
+
+
+def resolve_mode(query: str, mode: str = RETRIEVAL_MODE) -> str:
+    """The mode ``hybrid_search`` will use for ``query``; "auto" is never returned."""
+    if mode not in MODES:
+        raise ValueError(f"Unknown retrieval mode {mode!r}; expected one of {MODES}")
+    if mode == "auto":
+        return "lexical" if is_keyword_query(query) else "hybrid"
+    return mode
+
+
+def needs_query_vector(query: str, mode: str = RETRIEVAL_MODE) -> bool:
+    return resolve_mode(query, mode) != "lexical"
+
+
+def reciprocal_rank_fusion(
+    rankings: Iterable[List[Tuple[Document, float]]], k: int = RRF_K
+) -> List[Tuple[Document, float]]:
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, (doc, _) in enumerate(ranking):
+            scores[doc.id] = scores.get(doc.id, 0.0) + 1.0 / (k + rank + 1)
+            docs.setdefault(doc.id, doc)
+    fused = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    return [(docs[doc_id], score) for doc_id, score in fused]
+
+
+def hybrid_search(
+    store: PersistentVectorStore,
+    query: str,
+    k: int = 4,
+    mode: str = RETRIEVAL_MODE,
+    doc_ids: Optional[Iterable[str]] = None,
+    session_id: Optional[str] = None,
+    fetch_k: int = HYBRID_FETCH_K,
+    query_vector: Optional[List[float]] = None,
+) -> List[Tuple[Document, float]]:
+    """Retrieve ``k`` chunks using dense, lexical or fused rankings.
+
+    Scores are only comparable within one mode: cosine similarity for
+    "dense", BM25 for "lexical" and RRF for "hybrid". Pass
+    ``query_vector`` if the query has already been embedded.
+    """
+    mode = resolve_mode(query, mode)
+    doc_ids = list(doc_ids) if doc_ids is not None else None
+    scope = {"doc_ids": doc_ids, "session_id": session_id}
+
+    def dense_search(count: int) -> List[Tuple[Document, float]]:
+        vector = query_vector if query_vector is not None else store.embedding.embed_query(query)
+        return store.similarity_search_with_score_by_vector(vector, k=count, **scope)
+
+    if mode == "lexical":
+        lexical = store.lexical_search_with_score(query, k=k, **scope)
+        if lexical:
+            return lexical
+        mode = "dense"
+
+    if mode == "dense":
+        return dense_search(k)
+
+    dense = dense_search(max(k, fetch_k))
+    lexical = store.lexical_search_with_score(query, k=max(k, fetch_k), **scope)
+    return reciprocal_rank_fusion([dense, lexical])[:k]
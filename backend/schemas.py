@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 # Nested QAset model
 class QAsetSchema(BaseModel):
@@ -19,3 +19,45 @@ class StackSchema(BaseModel):
 
     class Config:
         orm_mode = True
+
+# Library listing without card bodies
+class StackSummarySchema(BaseModel):
+    id: int
+    name: str
+    description: str
+    card_count: int
+
+class StackPageSchema(BaseModel):
+    items: List[StackSummarySchema]
+    next_after_id: Optional[int] = None
+
+# Search hits are HTML-escaped text, with <mark> around matched terms
+class StackSearchHitSchema(BaseModel):
+    id: int
+    name: str
+    description: str
+    score: float
+
+class CardSearchHitSchema(BaseModel):
+    id: int
+    stack_id: int
+    stack_name: str
+    question: str
+    answer: str
+    score: float
+
+class SearchResultsSchema(BaseModel):
+    stacks: List[StackSearchHitSchema]
+    cards: List[CardSearchHitSchema]
+
+class FlashCardJobSchema(BaseModel):
+    id: str
+    status: str
+    stage: Optional[str] = None
+    progress: int
+    filename: Optional[str] = None
+    error: Optional[str] = None
+    stack_id: Optional[int] = None
+
+    class Config:
+        orm_mode = True
@@ -0,0 +1,137 @@
+import html
+import re
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+
+SNIPPET_OPEN = "<mark>"
+SNIPPET_CLOSE = "</mark>"
+SNIPPET_TOKENS = 16
+# FTS5 wraps matches in these control characters, which card text has no use
+# for; they become <mark> tags only after the text is HTML-escaped.
+_MATCH_OPEN = "\x02"
+_MATCH_CLOSE = "\x03"
+
+# The B-tree indexes that used to sit on long free-text columns. They could
+# not serve word lookups and only slowed down inserts.
+OBSOLETE_INDEXES = ["ix_qasets_question", "ix_qasets_answer", "ix_stacks_description"]
+
+# External-content FTS5 tables: the text lives only in stacks/qasets and the
+# triggers keep the inverted indexes in step with every insert/update/delete.
+FTS_TABLES = {
+    "qaset_fts": {
+        "source": "qasets",
+        "columns": ["question", "answer"],
+        "rank": "bm25(2.0, 1.0)",
+    },
+    "stack_fts": {
+        "source": "stacks",
+        "columns": ["name", "description"],
+        "rank": "bm25(3.0, 1.0)",
+    },
+}
+
+
+def _fts_ddl(table: str, source: str, columns: List[str]) -> List[str]:
+    cols = ", ".join(columns)
+    new_values = ", ".join(f"new.{c}" for c in columns)
+    old_values = ", ".join(f"old.{c}" for c in columns)
+    insert = f"INSERT INTO {table}(rowid, {cols}) VALUES (new.id, {new_values});"
+    delete = f"INSERT INTO {table}({table}, rowid, {cols}) VALUES ('delete', old.id, {old_values});"
+    return [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(
+            {cols}, content='{source}', content_rowid='id',
+            tokenize='porter unicode61 remove_diacritics 2'
+        )""",
+        f"CREATE TRIGGER IF NOT EXISTS {source}_fts_ai AFTER INSERT ON {source} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {source}_fts_ad AFTER DELETE ON {source} BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {source}_fts_au AFTER UPDATE ON {source} BEGIN {delete} {insert} END",
+    ]
+
+
+def create_search_index(engine: Engine):
+    """Create the FTS5 tables and triggers, backfilling them on first run."""
+    with engine.begin() as conn:
+        for name in OBSOLETE_INDEXES:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+        for table, spec in FTS_TABLES.items():
+            exists = conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+            ).first()
+            for statement in _fts_ddl(table, spec["source"], spec["columns"]):
+                conn.exec_driver_sql(statement)
+            if not exists:
+                conn.exec_driver_sql(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+                conn.exec_driver_sql(
+                    f"INSERT INTO {table}({table}, rank) VALUES ('rank', ?)", (spec["rank"],)
+                )
+
+
+def fts_query(query: str) -> str:
+    """Turn free text into a safe FTS5 query.
+
+    Every word must match, and the last one is treated as a prefix so
+    results show up while the user is still typing.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return ""
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _snippet(table: str, column: int) -> str:
+    return f"snippet({table}, {column}, char(2), char(3), '…', {SNIPPET_TOKENS})"
+
+
+def _highlight(value: str) -> str:
+    """Escape card text as HTML, then turn the FTS5 match markers into <mark> tags."""
+    return html.escape(value).replace(_MATCH_OPEN, SNIPPET_OPEN).replace(_MATCH_CLOSE, SNIPPET_CLOSE)
+
+
+def _escape_hit(row, fields: List[str]) -> dict:
+    hit = dict(row)
+    for field in fields:
+        if hit[field] is not None:
+            hit[field] = _highlight(hit[field])
+    return hit
+
+
+CARD_SEARCH = text(f"""
+    SELECT qasets.id AS id, qasets.stack_id AS stack_id, stacks.name AS stack_name,
+           {_snippet('qaset_fts', 0)} AS question, {_snippet('qaset_fts', 1)} AS answer,
+           qaset_fts.rank AS score
+    FROM qaset_fts
+    JOIN qasets ON qasets.id = qaset_fts.rowid
+    JOIN stacks ON stacks.id = qasets.stack_id
+    WHERE qaset_fts MATCH :query
+    ORDER BY qaset_fts.rank
+    LIMIT :limit
+""")
+
+STACK_SEARCH = text(f"""
+    SELECT stacks.id AS id, {_snippet('stack_fts', 0)} AS name,
+           {_snippet('stack_fts', 1)} AS description, stack_fts.rank AS score
+    FROM stack_fts
+    JOIN stacks ON stacks.id = stack_fts.rowid
+    WHERE stack_fts MATCH :query
+    ORDER BY stack_fts.rank
+    LIMIT :limit
+""")
+
+
+async def search_flash_cards(db: AsyncSession, query: str, limit: int) -> dict:
+    """Ranked stacks and cards matching ``query``; lower scores rank higher."""
+    match = fts_query(query)
+    if not match:
+        return {"stacks": [], "cards": []}
+    params = {"query": match, "limit": limit}
+    stacks = (await db.execute(STACK_SEARCH, params)).mappings().all()
+    cards = (await db.execute(CARD_SEARCH, params)).mappings().all()
+    return {
+        "stacks": [_escape_hit(row, ["name", "description"]) for row in stacks],
+        "cards": [_escape_hit(row, ["stack_name", "question", "answer"]) for row in cards],
+    }
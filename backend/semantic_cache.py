@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", str(24 * 3600)))
+
+Scope = Tuple[str, ...]
+
+
+def normalize(question: str) -> str:
+    return " ".join(question.lower().split())
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    vector: Optional[np.ndarray]
+    latency_ms: float
+    created_at: float
+    hits: int = 0
+
+
+@dataclass
+class CacheLookup:
+    scope: Scope
+    vector: Optional[np.ndarray]
+    generation: int
+    hit: Optional[CachedAnswer] = None
+
+
+class SemanticAnswerCache:
+    """Reuses answers to earlier questions that mean the same thing.
+
+    Entries are grouped by the exact set of documents the question was
+    answered against, and a lookup only compares against entries for the
+    same set. A hit needs cosine similarity of at least ``threshold``
+    between the question embeddings, which are the ones retrieval uses.
+    Questions retrieval answers without embedding (keyword queries) are
+    only matched by their normalized text. ``invalidate`` drops every entry
+    whose documents include a changed one; an answer generated while an
+    invalidation happened is not stored.
+    """
+
+    def __init__(
+        self,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+        ttl: float = SEMANTIC_CACHE_TTL,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+        self._generation = 0
+        self._scopes: "OrderedDict[Scope, List[CachedAnswer]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, question: str, scope: Scope, vector: Optional[Sequence[float]] = None) -> CacheLookup:
+        """Find a cached answer for ``question``; pass the result to ``store`` on a miss.
+
+        ``vector`` is the question's embedding, or None to match on text alone.
+        """
+        if vector is not None:
+            vector = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            vector = vector / norm if norm else vector
+        text = normalize(question)
+        with self._lock:
+            lookup = CacheLookup(scope, vector, self._generation)
+            entries = self._scopes.get(scope)
+            if entries:
+                now = time.time()
+                live = [e for e in entries if now - e.created_at <= self.ttl]
+                self._size -= len(entries) - len(live)
+                entries[:] = live
+            if not entries:
+                self.misses += 1
+                return lookup
+
+            hit = next((e for e in entries if normalize(e.question) == text), None)
+            if hit is None and vector is not None:
+                embedded = [e for e in entries if e.vector is not None]
+                if embedded:
+                    similarities = np.stack([e.vector for e in embedded]) @ vector
+                    best = int(np.argmax(similarities))
+                    if similarities[best] >= self.threshold:
+                        hit = embedded[best]
+            if hit is None:
+                self.misses += 1
+                return lookup
+
+            lookup.hit = hit
+            lookup.hit.hits += 1
+            self.hits += 1
+            self.saved_ms += lookup.hit.latency_ms
+            self._scopes.move_to_end(scope)
+            return lookup
+
+    def store(self, lookup: CacheLookup, question: str, answer: str, latency_ms: float):
+        if not lookup.scope or not answer:
+            return
+        entry = CachedAnswer(question, answer, lookup.vector, latency_ms, time.time())
+        with self._lock:
+            if lookup.generation != self._generation:
+                return
+            self._scopes.setdefault(lookup.scope, []).append(entry)
+            self._scopes.move_to_end(lookup.scope)
+            self._size += 1
+            # Evict the oldest answers of the least recently used scope first.
+            while self._size > self.max_entries:
+                scope, entries = next(iter(self._scopes.items()))
+                entries.pop(0)
+                self._size -= 1
+                if not entries:
+                    del self._scopes[scope]
+
+    def invalidate(self, doc_ids: Iterable[str]):
+        changed = set(doc_ids)
+        with self._lock:
+            self._generation += 1
+            for scope in [s for s in self._scopes if changed.intersection(s)]:
+                self._size -= len(self._scopes.pop(scope))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "saved_llm_ms": round(self.saved_ms, 1),
+        }
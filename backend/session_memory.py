@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, List, Optional, Tuple
+
+from tokens import CHARS_PER_TOKEN, estimate_tokens
+
+SESSION_MEMORY_MAX_SESSIONS = int(os.getenv("SESSION_MEMORY_MAX_SESSIONS", "1000"))
+SESSION_MEMORY_TTL = float(os.getenv("SESSION_MEMORY_TTL", "3600"))
+SESSION_MEMORY_WINDOW_TOKENS = int(os.getenv("SESSION_MEMORY_WINDOW_TOKENS", "1500"))
+SESSION_MEMORY_SUMMARY_TOKENS = int(os.getenv("SESSION_MEMORY_SUMMARY_TOKENS", "400"))
+SESSION_MEMORY_MAX_TOTAL_TOKENS = int(os.getenv("SESSION_MEMORY_MAX_TOTAL_TOKENS", "2000000"))
+
+Message = Tuple[str, str]
+Summarizer = Callable[[str, List[Message]], str]
+
+
+@dataclass
+class SessionMemory:
+    summary: str = ""
+    messages: Deque[Message] = field(default_factory=deque)
+    tokens: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+    compacting: bool = False
+
+
+class SessionMemoryStore:
+    """Bounded conversation history per session.
+
+    Each session keeps its newest messages within ``window_tokens`` plus a
+    rolling summary of everything older, so what goes into a prompt stays
+    the same size however long the conversation runs. Sessions idle for
+    ``ttl`` seconds are dropped, and the least recently used sessions are
+    evicted once there are more than ``max_sessions`` of them or they hold
+    more than ``max_total_tokens`` between them.
+    """
+
+    def __init__(
+        self,
+        summarize: Summarizer,
+        max_sessions: int = SESSION_MEMORY_MAX_SESSIONS,
+        ttl: float = SESSION_MEMORY_TTL,
+        window_tokens: int = SESSION_MEMORY_WINDOW_TOKENS,
+        summary_tokens: int = SESSION_MEMORY_SUMMARY_TOKENS,
+        max_total_tokens: int = SESSION_MEMORY_MAX_TOTAL_TOKENS,
+    ):
+        self.summarize = summarize
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.window_tokens = window_tokens
+        self.summary_tokens = summary_tokens
+        self.max_total_tokens = max_total_tokens
+        self.evictions = 0
+        self._sessions: "OrderedDict[str, SessionMemory]" = OrderedDict()
+        self._total_tokens = 0
+        self._lock = threading.Lock()
+
+    def _get(self, session_id: str) -> Optional[SessionMemory]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if time.monotonic() - session.last_used > self.ttl:
+            self._drop(session_id)
+            return None
+        session.last_used = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _drop(self, session_id: str):
+        session = self._sessions.pop(session_id)
+        self._total_tokens -= session.tokens + estimate_tokens(session.summary)
+
+    def _evict(self):
+        now = time.monotonic()
+        # Sessions are in LRU order, so expired ones are at the front.
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            over = len(self._sessions) > self.max_sessions or self._total_tokens > self.max_total_tokens
+            if not over and now - session.last_used <= self.ttl:
+                break
+            self._drop(session_id)
+            self.evictions += 1
+
+    def history(self, session_id: str) -> str:
+        """The summary and the newest messages that fit the token window."""
+        with self._lock:
+            session = self._get(session_id)
+            if session is None:
+                return ""
+            lines, budget = [], self.window_tokens
+            for role, text in reversed(session.messages):
+                line = f"{role}: {text}"
+                budget -= estimate_tokens(line)
+                if budget < 0:
+                    break
+                lines.append(line)
+            lines.reverse()
+            if session.summary:
+                lines.insert(0, f"Summary of the earlier conversation: {session.summary}")
+            return "\n".join(lines)
+
+    def append(self, session_id: str, question: str, answer: str) -> bool:
+        """Record one exchange. Returns True when the session needs ``compact``."""
+        with self._lock:
+            session = self._get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = SessionMemory()
+            for message in (("User", question), ("Assistant", answer)):
+                tokens = estimate_tokens(f"{message[0]}: {message[1]}")
+                session.messages.append(message)
+                session.tokens += tokens
+                self._total_tokens += tokens
+            self._evict()
+            return session.tokens > self.window_tokens and not session.compacting
+
+    def compact(self, session_id: str):
+        """Fold messages that no longer fit the window into the summary."""
+        with self._lock:
+            session = self._get(session_id)
+            if session is None or session.compacting:
+                return
+            overflow = []
+            tokens = session.tokens
+            while session.messages and tokens > self.window_tokens:
+                role, text = session.messages.popleft()
+                tokens -= estimate_tokens(f"{role}: {text}")
+                overflow.append((role, text))
+            if not overflow:
+                return
+            session.compacting = True
+            previous = session.summary
+
+        # The LLM call runs without the lock so other sessions are not blocked.
+        try:
+            summary = self.summarize(previous, overflow)
+        except Exception:
+            summary = " ".join([previous] + [f"{role}: {text}" for role, text in overflow])
+        limit = self.summary_tokens * CHARS_PER_TOKEN
+        if len(summary) > limit:
+            summary = summary[-limit:]
+
+        with self._lock:
+            session.compacting = False
+            removed = sum(estimate_tokens(f"{role}: {text}") for role, text in overflow)
+            if self._sessions.get(session_id) is not session:
+                return
+            session.tokens -= removed
+            self._total_tokens += estimate_tokens(summary) - estimate_tokens(previous) - removed
+            session.summary = summary
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "tokens": self._total_tokens,
+                "evictions": self.evictions,
+            }
+
+
+def llm_summarizer(llm) -> Summarizer:
+    def summarize(previous: str, messages: List[Message]) -> str:
+        transcript = "\n".join(f"{role}: {text}" for role, text in messages)
+        prompt = (
+            "Update the summary of a conversation between a user and a calendar assistant. "
+            "Keep names, dates, times and decisions. Answer with the new summary only, "
+            f"in at most {SESSION_MEMORY_SUMMARY_TOKENS * 3 // 4} words.\n\n"
+            f"Current summary:\n{previous or '(none)'}\n\nNew messages:\n{transcript}"
+        )
+        return getattr(llm.invoke(prompt), "content", "").strip()
+
+    return summarize
@@ -0,0 +1,195 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Once over max_entries, evict down to this share of it, so eviction runs
+# once per batch of inserts rather than on every one.
+SQLITE_CACHE_EVICT_TO = 0.9
+# Hits only record their last_used time in memory; the pending times are
+# written with the next insert, or once this many pile up or this many
+# seconds pass.
+SQLITE_CACHE_TOUCH_BATCH = 256
+SQLITE_CACHE_TOUCH_INTERVAL = 30.0
+# Expired rows are swept at most this often; reads skip them meanwhile.
+SQLITE_CACHE_SWEEP_INTERVAL = 60.0
+
+
+class SqliteLRUCache:
+    """Key/value blob cache in a single SQLite file with LRU eviction.
+
+    ``max_entries`` caps the number of rows; the least recently used rows are
+    dropped once it is exceeded. ``ttl`` (seconds) optionally expires rows
+    by creation time.
+
+    The row count is kept in memory and only recounted when evicting, and
+    recency updates from hits are batched, so a read-mostly cache does not
+    pay for a write or a table scan per call.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100_000, ttl: Optional[float] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value BLOB,
+                created_at REAL,
+                last_used REAL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_last_used ON cache (last_used)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_created_at ON cache (created_at)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        self._touched: Dict[str, float] = {}
+        self._touched_since = time.monotonic()
+        self._swept_at = 0.0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+
+        now = time.time()
+        found: Dict[str, bytes] = {}
+        expired: List[str] = []
+        with self._lock:
+            # SQLite limits bound parameters per statement, so look keys up in slices.
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, value, created_at FROM cache WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                for key, value, created_at in rows:
+                    if self.ttl is not None and now - created_at > self.ttl:
+                        expired.append(key)
+                    else:
+                        found[key] = value
+
+            if found:
+                if not self._touched:
+                    self._touched_since = time.monotonic()
+                self._touched.update((key, now) for key in found)
+            flush = len(self._touched) >= SQLITE_CACHE_TOUCH_BATCH or (
+                self._touched and time.monotonic() - self._touched_since >= SQLITE_CACHE_TOUCH_INTERVAL
+            )
+            if flush:
+                self._flush_touched()
+            if expired:
+                self._delete_keys(expired)
+                self.evictions += len(expired)
+            if flush or expired:
+                self._conn.commit()
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set(self, key: str, value: bytes):
+        self.set_many([(key, value)])
+
+    def set_many(self, items: Iterable[Tuple[str, bytes]]):
+        now = time.time()
+        values = dict(items)
+        if not values:
+            return
+        with self._lock:
+            existing = set()
+            keys = list(values)
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                existing.update(row[0] for row in self._conn.execute(
+                    f"SELECT key FROM cache WHERE key IN ({placeholders})", batch
+                ))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, created_at, last_used) VALUES (?, ?, ?, ?)",
+                [(key, value, now, now) for key, value in values.items()],
+            )
+            self._count += len(values) - len(existing)
+            for key in values:
+                self._touched.pop(key, None)
+            self._flush_touched()
+            self._evict()
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._touched.pop(key, None)
+            self._delete_keys([key])
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+            self._conn.commit()
+            self._count = 0
+            self._touched.clear()
+
+    def _delete_keys(self, keys: List[str]):
+        cursor = self._conn.executemany("DELETE FROM cache WHERE key = ?", [(key,) for key in keys])
+        self._count -= cursor.rowcount
+
+    def _flush_touched(self):
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE cache SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def _evict(self):
+        if self.ttl is not None and time.monotonic() - self._swept_at >= SQLITE_CACHE_SWEEP_INTERVAL:
+            self._swept_at = time.monotonic()
+            cursor = self._conn.execute(
+                "DELETE FROM cache WHERE created_at < ?", (time.time() - self.ttl,)
+            )
+            self._count -= cursor.rowcount
+            self.evictions += cursor.rowcount
+
+        if self._count <= self.max_entries:
+            return
+        # Recount here, where it is rare, in case another process shares the file.
+        self._count = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        overflow = self._count - int(self.max_entries * SQLITE_CACHE_EVICT_TO)
+        if self._count > self.max_entries and overflow > 0:
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY last_used LIMIT ?)",
+                (overflow,),
+            )
+            self._count -= overflow
+            self.evictions += overflow
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": self._count,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,53 @@
+import json
+import time
+from typing import AsyncIterator, Optional, Union
+
+from fastapi.responses import StreamingResponse
+
+from metrics import trace_summary
+
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+async def sse_stream(
+    chunks: AsyncIterator[Union[str, dict]], started: float, event: Optional[str] = None
+) -> AsyncIterator[str]:
+    """Relay chunks as SSE events, then a ``done`` event.
+
+    Text chunks are sent as ``{"text": chunk}``, dicts as they are.
+    ``done`` carries ``ttfb_ms`` (request start to first chunk) and
+    ``total_ms`` so time-to-first-byte can be tracked apart from total
+    latency, and ``stages`` when the request is traced (see ``metrics``).
+    ``started`` is a ``time.perf_counter()`` reading.
+    """
+    ttfb = None
+    try:
+        async for chunk in chunks:
+            if ttfb is None:
+                ttfb = time.perf_counter() - started
+            yield sse_event({"text": chunk} if isinstance(chunk, str) else chunk, event=event)
+    except Exception as e:
+        yield sse_event({"error": str(e)}, event="error")
+
+    total = time.perf_counter() - started
+    done = {
+        "ttfb_ms": round(ttfb * 1000, 1) if ttfb is not None else None,
+        "total_ms": round(total * 1000, 1),
+    }
+    stages = trace_summary()
+    if stages is not None:
+        done["stages"] = stages
+    yield sse_event(done, event="done")
+
+
+def sse_response(
+    chunks: AsyncIterator[Union[str, dict]], started: float, event: Optional[str] = None
+) -> StreamingResponse:
+    return StreamingResponse(
+        sse_stream(chunks, started, event=event),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
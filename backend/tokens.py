@@ -0,0 +1,17 @@
+import math
+
+# Gemini averages roughly four characters per token for English text. This
+# avoids a countTokens round trip on hot paths where an estimate is enough.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def prompt_tokens(response, prompt) -> int:
+    """Input tokens the model reported for ``response``, or an estimate for ``prompt``."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage and usage.get("input_tokens"):
+        return usage["input_tokens"]
+    return estimate_tokens(prompt.to_string() if hasattr(prompt, "to_string") else str(prompt))
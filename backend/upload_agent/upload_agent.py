@@ -1,70 +1,119 @@
 from dotenv import load_dotenv
 load_dotenv()
+import asyncio
 import os
-from llm_config import llm
-from langchain import hub
-from langchain_core.vectorstores import InMemoryVectorStore
+import time
+from llm_config import llm, embeddings, EMBEDDING_NAMESPACE
 from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langgraph.graph import START, StateGraph
-from typing_extensions import List, TypedDict
+from typing_extensions import List, Optional, Tuple, TypedDict
 from fastapi import UploadFile
-from langchain_community.document_loaders import PyPDFLoader
 from langchain.prompts import ChatPromptTemplate
-
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
-embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-
-vector_store = InMemoryVectorStore(embeddings)
-prompt = hub.pull("rlm/rag-prompt")
+from vector_store import PersistentVectorStore, VECTOR_STORE_DIR
+from ingest import EmbeddingBatcher, ingest_file
+from retrieval import hybrid_search, needs_query_vector
+from context_packing import CONTEXT_FETCH_K, assemble_context
+from tokens import prompt_tokens
+from semantic_cache import SemanticAnswerCache
+from metrics import LLMMetricsCallback, stage
+
+vector_store = PersistentVectorStore(embeddings, os.path.join(VECTOR_STORE_DIR, "upload" + EMBEDDING_NAMESPACE))
+answer_cache = SemanticAnswerCache()
+vector_store.on_change(answer_cache.invalidate)
+llm_metrics = LLMMetricsCallback("upload")
 
 class State(TypedDict):
     question: str
+    document_ids: Optional[List[str]]
+    session_id: Optional[str]
+    query_vector: Optional[List[float]]
     context: List[Document]
+    scores: List[float]
     answer: str
+    prompt_tokens: int
 
 def retrieve(state: State):
-    retrieved_docs = vector_store.similarity_search(state["question"])
-    return {"context": retrieved_docs}
+    with stage("retrieve"):
+        retrieved = hybrid_search(
+            vector_store,
+            state["question"],
+            k=CONTEXT_FETCH_K,
+            doc_ids=state.get("document_ids"),
+            session_id=state.get("session_id"),
+            query_vector=state.get("query_vector"),
+        )
+    return {"context": [doc for doc, _ in retrieved], "scores": [score for _, score in retrieved]}
 
 prompt = ChatPromptTemplate.from_template(
     """You are a helpful expert assistant. You give well-organized exhaustive responses.
 Use the following context to answer the user's question **exactly as instructed**, including word counts or formatting requests. Format with bullet points whenever possible. Use bold font for highlighting.
-Context: {context}
+Context (numbered passages, each labelled with its source): {context}
 Question: {question}
 Answer:"""
 )
 
+def build_messages(state: State):
+    with stage("context_pack"):
+        context, _ = assemble_context(vector_store, list(zip(state["context"], state["scores"])))
+    return prompt.invoke({"question": state["question"], "context": context})
+
 def generate(state: State):
-    docs_content = "\n\n".join(doc.page_content for doc in state["context"])
-    messages = prompt.invoke({"question": state["question"], "context": docs_content})
-    response = llm.invoke(messages)
-    return {"answer": response.content}
+    messages = build_messages(state)
+    response = llm.invoke(messages, config={"callbacks": [llm_metrics]})
+    return {"answer": response.content, "prompt_tokens": prompt_tokens(response, messages)}
 
 graph_builder = StateGraph(State).add_sequence([retrieve, generate])
 graph_builder.add_edge(START, "retrieve")
 graph = graph_builder.compile()
 
-async def ingest_uploaded_file(file: UploadFile):
-    file_path = f"./{file.filename}"
-
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
-
-    loader = PyPDFLoader(file_path)
-    pages = loader.load()
-
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    splits = text_splitter.split_documents(pages)
-
-    vector_store.add_documents(splits)
-
-    os.remove(file_path)
-
-    return f"Loaded {len(splits)} document chunks from {file.filename}"
-
-
-
-
-
-
+def answer_scope(document_ids: Optional[List[str]] = None, session_id: Optional[str] = None) -> Tuple[str, ...]:
+    """The documents a question is answered against; cached answers are only shared within one."""
+    if document_ids:
+        return tuple(sorted(set(document_ids)))
+    return tuple(sorted(doc.doc_id for doc in vector_store.documents(session_id)))
+
+def embed_question(question: str) -> Optional[List[float]]:
+    """The one embedding of ``question`` that both the answer cache and retrieval use.
+
+    None for questions retrieval answers from the keyword index alone.
+    """
+    return embeddings.embed_query(question) if needs_query_vector(question) else None
+
+def answer_question(question: str, document_ids: Optional[List[str]] = None, session_id: Optional[str] = None) -> dict:
+    vector = embed_question(question)
+    lookup = answer_cache.lookup(question, answer_scope(document_ids, session_id), vector)
+    if lookup.hit is not None:
+        return {"answer": lookup.hit.answer, "cached": True}
+    started = time.perf_counter()
+    response = graph.invoke({
+        "question": question, "document_ids": document_ids, "session_id": session_id, "query_vector": vector,
+    })
+    answer_cache.store(lookup, question, response["answer"], (time.perf_counter() - started) * 1000)
+    return {"answer": response["answer"], "prompt_tokens": response["prompt_tokens"]}
+
+async def astream_answer(question: str, document_ids: Optional[List[str]] = None, session_id: Optional[str] = None):
+    vector = await asyncio.to_thread(embed_question, question)
+    # Listing documents can expire and compact the store, so it stays off the event loop too.
+    scope = await asyncio.to_thread(answer_scope, document_ids, session_id)
+    lookup = await asyncio.to_thread(answer_cache.lookup, question, scope, vector)
+    if lookup.hit is not None:
+        yield lookup.hit.answer
+        return
+    started = time.perf_counter()
+    state = {"question": question, "document_ids": document_ids, "session_id": session_id, "query_vector": vector}
+    state.update(await asyncio.to_thread(retrieve, state))
+    parts = []
+    messages = await asyncio.to_thread(build_messages, state)
+    async for chunk in llm.astream(messages, config={"callbacks": [llm_metrics]}):
+        if chunk.content:
+            parts.append(chunk.content)
+            yield chunk.content
+    # Only complete streams reach this point.
+    answer_cache.store(lookup, question, "".join(parts), (time.perf_counter() - started) * 1000)
+
+async def ingest_uploaded_file(file: UploadFile, session_id: Optional[str] = None):
+    batcher = EmbeddingBatcher(embeddings)
+    try:
+        return await ingest_file(file, vector_store, batcher, session_id=session_id)
+    finally:
+        await batcher.aclose()
@@ -0,0 +1,606 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", "./vector_store")
+VECTOR_STORE_MAX_BYTES = int(os.getenv("VECTOR_STORE_MAX_BYTES", str(512 * 1024 * 1024)))
+VECTOR_STORE_DOC_TTL = float(os.getenv("VECTOR_STORE_DOC_TTL", "0"))
+
+# "int8" stores each vector as int8 codes plus one float32 scale per row,
+# about 4x smaller than "float32" at a small cost in score precision. Only
+# applies to new stores; an existing store keeps the type it was created with.
+VECTOR_STORE_DTYPE = os.getenv("VECTOR_STORE_DTYPE", "float32")
+VECTOR_DTYPES = ("float32", "int8")
+
+# Compact the vector file once this share of its rows belongs to deleted documents.
+COMPACT_DEAD_RATIO = 0.25
+# int8 rows are widened to float32 this many at a time while scoring.
+SCORE_BLOCK_ROWS = 16384
+
+
+@dataclass
+class StoredDocument:
+    doc_id: str
+    session_id: Optional[str]
+    source: Optional[str]
+    start_row: int
+    stop_row: int
+    created_at: float
+
+    @property
+    def chunks(self) -> int:
+        return self.stop_row - self.start_row
+
+
+class PersistentVectorStore(VectorStore):
+    """Append-only vector store persisted under ``persist_directory``.
+
+    Vectors are L2-normalized and appended to a raw float32 (or int8 with
+    per-row scales) file that is memory-mapped on open, so startup cost does
+    not depend on the number of stored chunks. A row's position in the file
+    is its offset in the ``chunks`` table; chunk text and metadata live in
+    SQLite and are only read for the rows a search returns.
+
+    Every ``add_texts`` call stores one document (an upload) whose chunks
+    occupy a contiguous row range. Searches can be scoped to document or
+    session IDs, in which case only those ranges are scored. Deleted,
+    expired or over-budget documents are dropped from the index right away
+    and their rows are reclaimed by compaction.
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        persist_directory: str,
+        max_bytes: int = VECTOR_STORE_MAX_BYTES,
+        doc_ttl: float = VECTOR_STORE_DOC_TTL,
+        dtype: str = VECTOR_STORE_DTYPE,
+    ):
+        if dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Unknown vector dtype {dtype!r}; expected one of {VECTOR_DTYPES}")
+        self.embedding = embedding
+        self.persist_directory = persist_directory
+        self.max_bytes = max_bytes
+        self.doc_ttl = doc_ttl
+        os.makedirs(persist_directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._listeners: List[Callable[[List[str]], None]] = []
+        self._conn = sqlite3.connect(
+            os.path.join(persist_directory, "docs.sqlite3"), check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS chunks (
+                id TEXT PRIMARY KEY,
+                row INTEGER NOT NULL,
+                doc_id TEXT NOT NULL,
+                page_content TEXT,
+                metadata TEXT
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_chunks_row ON chunks (row)")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS documents (
+                doc_id TEXT PRIMARY KEY,
+                session_id TEXT,
+                source TEXT,
+                start_row INTEGER NOT NULL,
+                stop_row INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+        self._create_lexical_index()
+        self._migrate_legacy_docs()
+        self._conn.commit()
+
+        self._dim = self._meta("dim", int)
+        self.dtype = self._meta("dtype") or ("float32" if self._dim is not None else dtype)
+        self._vectors_file = self._meta("vectors_file") or f"vectors{_EXTENSIONS[self.dtype]}"
+        self._matrix = None
+        self._open()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __len__(self) -> int:
+        return 0 if self._matrix is None else self._matrix.shape[0]
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.persist_directory, self._vectors_file)
+
+    @property
+    def _row_dtype(self) -> np.dtype:
+        return _row_dtype(self.dtype, self._dim)
+
+    def _meta(self, key: str, cast=str):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return cast(row[0]) if row else None
+
+    def _set_meta(self, key: str, value):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value))
+        )
+
+    def _migrate_legacy_docs(self):
+        # Stores written before documents were tracked keep their chunks in
+        # a single "legacy" document.
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'docs'"
+        ).fetchone()
+        if not exists:
+            return
+        self._conn.execute(
+            """INSERT INTO chunks (id, row, doc_id, page_content, metadata)
+               SELECT id, row, 'legacy', page_content, metadata FROM docs"""
+        )
+        count = self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+        if count:
+            self._conn.execute(
+                "INSERT INTO documents (doc_id, start_row, stop_row, created_at) VALUES ('legacy', 0, ?, ?)",
+                (count, time.time()),
+            )
+        self._conn.execute("DROP TABLE docs")
+
+    def _create_lexical_index(self):
+        # BM25 index over chunk text. It uses the chunks table as external
+        # content, so the text is stored once; compaction only renumbers
+        # ``row`` and leaves the index untouched.
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunks_fts'"
+        ).fetchone()
+        self._conn.executescript(
+            """CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+                page_content, content='chunks', content_rowid='rowid',
+                tokenize='porter unicode61 remove_diacritics 2'
+            );
+            CREATE TRIGGER IF NOT EXISTS chunks_fts_ai AFTER INSERT ON chunks BEGIN
+                INSERT INTO chunks_fts(rowid, page_content) VALUES (new.rowid, new.page_content);
+            END;
+            CREATE TRIGGER IF NOT EXISTS chunks_fts_ad AFTER DELETE ON chunks BEGIN
+                INSERT INTO chunks_fts(chunks_fts, rowid, page_content) VALUES ('delete', old.rowid, old.page_content);
+            END;
+            CREATE TRIGGER IF NOT EXISTS chunks_fts_au AFTER UPDATE OF page_content ON chunks BEGIN
+                INSERT INTO chunks_fts(chunks_fts, rowid, page_content) VALUES ('delete', old.rowid, old.page_content);
+                INSERT INTO chunks_fts(rowid, page_content) VALUES (new.rowid, new.page_content);
+            END;"""
+        )
+        if not exists:
+            self._conn.execute("INSERT INTO chunks_fts(chunks_fts) VALUES ('rebuild')")
+
+    def _open(self):
+        self._documents = {
+            row[0]: StoredDocument(*row)
+            for row in self._conn.execute(
+                """SELECT doc_id, session_id, source, start_row, stop_row, created_at
+                   FROM documents WHERE deleted = 0 ORDER BY start_row"""
+            )
+        }
+        self._total_rows = self._conn.execute(
+            "SELECT COALESCE(MAX(stop_row), 0) FROM documents"
+        ).fetchone()[0]
+
+        self._remove_stale_vector_files()
+        if self._dim is None or not os.path.exists(self._vectors_path):
+            self._matrix = None
+            return
+
+        # A crash between the vector append and the SQLite commit can leave
+        # trailing vectors without a document; trim them so both sides agree.
+        row_bytes = self._row_dtype.itemsize
+        size = os.path.getsize(self._vectors_path)
+        count = min(self._total_rows, size // row_bytes)
+        if size != count * row_bytes:
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(count * row_bytes)
+
+        if count == 0:
+            self._matrix = None
+            return
+        self._matrix = np.memmap(self._vectors_path, dtype=self._row_dtype, mode="r", shape=(count,))
+
+    def _remove_stale_vector_files(self):
+        for name in os.listdir(self.persist_directory):
+            if name.startswith("vectors") and name.endswith((".f32", ".i8")) and name != self._vectors_file:
+                os.remove(os.path.join(self.persist_directory, name))
+
+    def on_change(self, listener: Callable[[List[str]], None]):
+        """Call ``listener`` with the IDs of documents that are deleted, expire or are evicted."""
+        self._listeners.append(listener)
+
+    def documents(self, session_id: Optional[str] = None) -> List[StoredDocument]:
+        with self._lock:
+            self._expire()
+            return [
+                doc for doc in self._documents.values()
+                if session_id is None or doc.session_id == session_id
+            ]
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        vectors = self.embedding.embed_documents(texts)
+        return self.add_vectors(vectors, texts, metadatas=metadatas, ids=ids, **kwargs)
+
+    def add_vectors(
+        self,
+        vectors: List[List[float]],
+        texts: List[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        doc_id: Optional[str] = None,
+        session_id: Optional[str] = None,
+        source: Optional[str] = None,
+    ) -> List[str]:
+        texts = list(texts)
+        if len(vectors) != len(texts):
+            raise ValueError(f"Got {len(vectors)} vectors for {len(texts)} texts")
+        if not texts:
+            return []
+        doc_id = doc_id or uuid.uuid4().hex
+        ids = [i or uuid.uuid4().hex for i in ids] if ids else [uuid.uuid4().hex for _ in texts]
+        metadatas = [
+            {**(metadata or {}), "doc_id": doc_id}
+            for metadata in (metadatas or [{} for _ in texts])
+        ]
+        matrix = _normalize(np.asarray(vectors, dtype=np.float32))
+
+        with self._lock:
+            if self._dim is None:
+                self._dim = matrix.shape[1]
+                self._set_meta("dim", self._dim)
+                self._set_meta("dtype", self.dtype)
+            elif matrix.shape[1] != self._dim:
+                raise ValueError(
+                    f"Embedding dimension {matrix.shape[1]} does not match the "
+                    f"store's dimension {self._dim} in {self.persist_directory}"
+                )
+
+            start = self._total_rows
+            with open(self._vectors_path, "ab") as f:
+                f.write(_encode(matrix, self.dtype).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            self._conn.executemany(
+                "INSERT INTO chunks (id, row, doc_id, page_content, metadata) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (ids[i], start + i, doc_id, texts[i], json.dumps(metadatas[i]))
+                    for i in range(len(texts))
+                ],
+            )
+            self._conn.execute(
+                """INSERT INTO documents (doc_id, session_id, source, start_row, stop_row, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (doc_id, session_id, source, start, start + len(texts), time.time()),
+            )
+            self._conn.commit()
+            self._open()
+            self._enforce_limits(keep=doc_id)
+
+        return ids
+
+    def delete_documents(self, doc_ids: Iterable[str]) -> List[str]:
+        with self._lock:
+            removed = [doc_id for doc_id in doc_ids if doc_id in self._documents]
+            if not removed:
+                return []
+            self._conn.executemany(
+                "UPDATE documents SET deleted = 1 WHERE doc_id = ?", [(d,) for d in removed]
+            )
+            self._conn.commit()
+            for doc_id in removed:
+                del self._documents[doc_id]
+            self._maybe_compact()
+        for listener in self._listeners:
+            listener(removed)
+        return removed
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        # Chunks are only removable as part of their document, so ``ids``
+        # are document IDs here.
+        return bool(self.delete_documents(ids or []))
+
+    def _expire(self):
+        if not self.doc_ttl:
+            return
+        cutoff = time.time() - self.doc_ttl
+        expired = [d.doc_id for d in self._documents.values() if d.created_at < cutoff]
+        if expired:
+            self.delete_documents(expired)
+
+    def _enforce_limits(self, keep: Optional[str] = None):
+        self._expire()
+        row_bytes = self._row_dtype.itemsize if self._dim else 0
+        live = sum(doc.chunks for doc in self._documents.values()) * row_bytes
+        evict = []
+        for doc in sorted(self._documents.values(), key=lambda d: d.created_at):
+            if live <= self.max_bytes:
+                break
+            if doc.doc_id == keep:
+                continue
+            evict.append(doc.doc_id)
+            live -= doc.chunks * row_bytes
+        if evict:
+            self.delete_documents(evict)
+
+    def _maybe_compact(self):
+        live = sum(doc.chunks for doc in self._documents.values())
+        dead = self._total_rows - live
+        if self._total_rows and dead / self._total_rows >= COMPACT_DEAD_RATIO:
+            self.compact()
+
+    def compact(self):
+        """Rewrite the vector file without rows of deleted documents.
+
+        The new file is written under a new name and switched to in the same
+        SQLite transaction that renumbers the chunks, so a crash at any point
+        leaves a consistent store.
+        """
+        with self._lock:
+            live = sorted(self._documents.values(), key=lambda d: d.start_row)
+            new_file = f"vectors.{uuid.uuid4().hex[:8]}{_EXTENSIONS[self.dtype]}"
+            new_path = os.path.join(self.persist_directory, new_file)
+
+            with open(new_path, "wb") as f:
+                for doc in live:
+                    if self._matrix is not None:
+                        f.write(np.asarray(self._matrix[doc.start_row:doc.stop_row]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            with self._conn:
+                self._conn.execute(
+                    "DELETE FROM chunks WHERE doc_id IN (SELECT doc_id FROM documents WHERE deleted = 1)"
+                )
+                self._conn.execute("DELETE FROM documents WHERE deleted = 1")
+                offset = 0
+                for doc in live:
+                    shift = doc.start_row - offset
+                    self._conn.execute(
+                        "UPDATE chunks SET row = row - ? WHERE doc_id = ?", (shift, doc.doc_id)
+                    )
+                    self._conn.execute(
+                        "UPDATE documents SET start_row = ?, stop_row = ? WHERE doc_id = ?",
+                        (offset, offset + doc.chunks, doc.doc_id),
+                    )
+                    offset += doc.chunks
+                self._set_meta("vectors_file", new_file)
+
+            self._matrix = None
+            self._vectors_file = new_file
+            self._open()
+
+    def _ranges(
+        self, doc_ids: Optional[Iterable[str]], session_id: Optional[str]
+    ) -> List[Tuple[int, int]]:
+        docs = self._documents.values()
+        if doc_ids is not None:
+            wanted = set(doc_ids)
+            docs = [d for d in docs if d.doc_id in wanted]
+        if session_id is not None:
+            docs = [d for d in docs if d.session_id == session_id]
+
+        # Adjacent documents are merged so each contiguous block is scored
+        # with a single matrix-vector product.
+        ranges: List[Tuple[int, int]] = []
+        for doc in sorted(docs, key=lambda d: d.start_row):
+            stop = min(doc.stop_row, len(self))
+            if doc.start_row >= stop:
+                continue
+            if ranges and ranges[-1][1] == doc.start_row:
+                ranges[-1] = (ranges[-1][0], stop)
+            else:
+                ranges.append((doc.start_row, stop))
+        return ranges
+
+    def _fetch(self, rows: List[int]) -> dict:
+        placeholders = ",".join("?" * len(rows))
+        cursor = self._conn.execute(
+            f"SELECT row, id, page_content, metadata FROM chunks WHERE row IN ({placeholders})",
+            rows,
+        )
+        return {
+            row: Document(id=chunk_id, page_content=content, metadata=json.loads(metadata))
+            for row, chunk_id, content, metadata in cursor
+        }
+
+    def vectors_by_ids(self, ids: List[str]) -> np.ndarray:
+        """The stored unit vectors of the given chunks; zeros for unknown IDs."""
+        with self._lock:
+            if self._matrix is None or not ids:
+                return np.zeros((len(ids), self._dim or 0), dtype=np.float32)
+            placeholders = ",".join("?" * len(ids))
+            rows = dict(self._conn.execute(
+                f"SELECT id, row FROM chunks WHERE id IN ({placeholders})", ids
+            ).fetchall())
+            vectors = np.zeros((len(ids), self._dim), dtype=np.float32)
+            for i, chunk_id in enumerate(ids):
+                row = rows.get(chunk_id)
+                if row is None or row >= len(self):
+                    continue
+                stored = self._matrix[row]
+                if self.dtype == "int8":
+                    vectors[i] = stored["codes"].astype(np.float32) * stored["scale"]
+                else:
+                    vectors[i] = stored
+        return _normalize(vectors)
+
+    def similarity_search_with_score_by_vectors(
+        self,
+        embeddings: List[List[float]],
+        k: int = 4,
+        doc_ids: Optional[Iterable[str]] = None,
+        session_id: Optional[str] = None,
+    ) -> List[List[Tuple[Document, float]]]:
+        """Top ``k`` chunks for each of several query vectors in one pass."""
+        if not embeddings:
+            return []
+        with self._lock:
+            self._expire()
+            matrix = self._matrix
+            ranges = self._ranges(doc_ids, session_id) if matrix is not None else []
+            if not ranges or k <= 0:
+                return [[] for _ in embeddings]
+
+            queries = _normalize(np.asarray(embeddings, dtype=np.float32)).T
+            scores = np.concatenate([
+                self._score(matrix[block:min(block + SCORE_BLOCK_ROWS, stop)], queries)
+                for start, stop in ranges
+                for block in range(start, stop, SCORE_BLOCK_ROWS)
+            ])
+            rows = np.concatenate([np.arange(start, stop) for start, stop in ranges])
+
+            k = min(k, scores.shape[0])
+            tops = []
+            for column in scores.T:
+                top = np.argpartition(-column, k - 1)[:k]
+                tops.append(top[np.argsort(-column[top])])
+
+            docs = self._fetch(sorted({int(rows[i]) for top in tops for i in top}))
+        return [
+            [(docs[int(rows[i])], float(column[i])) for i in top if int(rows[i]) in docs]
+            for top, column in zip(tops, scores.T)
+        ]
+
+    def _score(self, block: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        if self.dtype == "int8":
+            return (block["codes"].astype(np.float32) @ queries) * block["scale"][:, None]
+        return block @ queries
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        doc_ids: Optional[Iterable[str]] = None,
+        session_id: Optional[str] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vectors(
+            [embedding], k=k, doc_ids=doc_ids, session_id=session_id
+        )[0]
+
+    def batch_similarity_search_with_score(
+        self, queries: List[str], k: int = 4, **kwargs: Any
+    ) -> List[List[Tuple[Document, float]]]:
+        embeddings = [self.embedding.embed_query(query) for query in queries]
+        return self.similarity_search_with_score_by_vectors(embeddings, k=k, **kwargs)
+
+    def lexical_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        doc_ids: Optional[Iterable[str]] = None,
+        session_id: Optional[str] = None,
+    ) -> List[Tuple[Document, float]]:
+        """BM25 search over chunk text. Higher scores are better."""
+        match = _match_query(query)
+        if not match or k <= 0:
+            return []
+        with self._lock:
+            self._expire()
+            wanted = self._ranges(doc_ids, session_id) if self._matrix is not None else []
+            if not wanted:
+                return []
+            where = " OR ".join("(chunks.row >= ? AND chunks.row < ?)" for _ in wanted)
+            cursor = self._conn.execute(
+                f"""SELECT chunks.id, chunks.page_content, chunks.metadata, bm25(chunks_fts)
+                    FROM chunks_fts JOIN chunks ON chunks.rowid = chunks_fts.rowid
+                    WHERE chunks_fts MATCH ? AND ({where})
+                    ORDER BY bm25(chunks_fts) LIMIT ?""",
+                [match, *[bound for rng in wanted for bound in rng], k],
+            )
+            return [
+                (Document(id=chunk_id, page_content=content, metadata=json.loads(metadata)), -score)
+                for chunk_id, content, metadata, score in cursor
+            ]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        embedding = self.embedding.embed_query(query)
+        return self.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        return [
+            doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)
+        ]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        persist_directory: str = VECTOR_STORE_DIR,
+        **kwargs: Any,
+    ) -> "PersistentVectorStore":
+        store = cls(embedding, persist_directory)
+        store.add_texts(texts, metadatas=metadatas, **kwargs)
+        return store
+
+
+def _match_query(query: str) -> str:
+    # Quote every word so user text can never be parsed as FTS5 syntax; any
+    # word may match and bm25 weighs the rare ones.
+    words = re.findall(r"\w+", query)
+    return " OR ".join(f'"{word}"' for word in words)
+
+
+_EXTENSIONS = {"float32": ".f32", "int8": ".i8"}
+
+
+def _row_dtype(dtype: str, dim: Optional[int]) -> np.dtype:
+    if dtype == "int8":
+        return np.dtype([("scale", "<f4"), ("codes", "i1", (dim,))])
+    return np.dtype(("<f4", (dim,)))
+
+
+def _encode(matrix: np.ndarray, dtype: str) -> np.ndarray:
+    if dtype == "float32":
+        return matrix
+    # Symmetric per-row quantization: the largest component maps to +-127.
+    scale = np.abs(matrix).max(axis=1) / 127.0
+    scale[scale == 0] = 1.0
+    rows = np.empty(matrix.shape[0], dtype=_row_dtype(dtype, matrix.shape[1]))
+    rows["scale"] = scale
+    rows["codes"] = np.clip(np.rint(matrix / scale[:, None]), -127, 127)
+    return rows
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
@@ -92,8 +92,9 @@ export default function Schedule() {
         body: data,
       });
 
-      const result = await response.json();
-      console.log(result);
+      const job = await response.json();
+      console.log(job);
+      await waitForJob(job.id);
       fetchFlashCards();
     } catch (error) {
       console.error("Error:", error);
@@ -102,6 +103,18 @@ export default function Schedule() {
     }
   };
 
+  const waitForJob = async (jobId: string) => {
+    while (true) {
+      const response = await fetch(
+        `http://localhost:8000/flash-card-jobs/${jobId}`
+      );
+      const job = await response.json();
+      if (job.status === "succeeded") return job;
+      if (job.status === "failed") throw new Error(job.error);
+      await new Promise((resolve) => setTimeout(resolve, 1500));
+    }
+  };
+
   const handleDeleteStack = async (stackId: number) => {
     try {
       const response = await fetch(
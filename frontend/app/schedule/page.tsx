@@ -9,6 +9,7 @@ import { faSpinner } from "@fortawesome/free-solid-svg-icons";
 export default function Schedule() {
   const [response, setResponse] = useState<string>("");
   const [loading, setLoading] = useState<boolean>(false);
+  const [sessionId, setSessionId] = useState<string | null>(null);
   const [formData, setFormData] = useState({
     question: "",
   });
@@ -31,12 +32,13 @@ export default function Schedule() {
         headers: {
           "Content-Type": "application/json",
         },
-        body: JSON.stringify(formData),
+        body: JSON.stringify({ ...formData, session_id: sessionId }),
       });
 
       if (response.ok) {
         const result = await response.json();
         setLoading(false);
+        setSessionId(result.session_id);
         setResponse(result.response.output);
       }
     } catch (error) {
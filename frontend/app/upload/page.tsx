@@ -15,6 +15,7 @@ export default function Upload() {
   const [copied, setCopied] = useState<boolean>(false);
   const [uploadedFiles, setUploadFiles] = useState<File[]>([]);
   const [formData, setFormData] = useState({ question: "" });
+  const [documentIds, setDocumentIds] = useState<string[]>([]);
 
   const handleChangeRequest = (
     e: React.ChangeEvent<HTMLInputElement | HTMLTextAreaElement>
@@ -44,6 +45,7 @@ export default function Upload() {
       });
       const result = await response.json();
       console.log(result);
+      setDocumentIds(result.document_ids ?? []);
       setUploaded(true);
     } catch (error) {
       console.error("Error:", error);
@@ -58,7 +60,10 @@ export default function Upload() {
       const response = await fetch("http://localhost:8000/upload/ask", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify(formData),
+        body: JSON.stringify({
+          ...formData,
+          document_ids: documentIds.length ? documentIds : undefined,
+        }),
       });
 
       const result = await response.json();